@@ -0,0 +1,19 @@
+# ===== Arquivo: gunicorn.conf.py =====
+# Uso: gunicorn main:app -c gunicorn.conf.py
+#
+# /analyze é o gargalo (pandas + LLM); se possível rode-o em workers separados do /chat/.
+import multiprocessing
+import os
+
+worker_class = "uvicorn.workers.UvicornWorker"
+# Um worker por CPU (não 2*CPU+1): cada worker já é concorrente por dentro e carrega o próprio orçamento:
+#   - threadpool do anyio: ANALYZE_THREADPOOL_SIZE (64) threads para o código síncrono
+#   - ANALYZE_PLATFORM_LOAD_WORKERS (8) threads de carga + 8 de busca vetorial
+#   - cache de DFs de até ANALYZE_PLATFORM_DF_CACHE_BYTES (256 MiB), além dos caches de resumo/narrativa
+#   - pool do SQLAlchemy (padrão 5 + 10 overflow = até 15 conexões no RDS)
+# Memória ~ workers x (256 MiB + base do processo) e conexões ~ workers x 15: confira antes de subir WEB_CONCURRENCY.
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = 30
+keepalive = 5
+bind = os.getenv("BIND", f"0.0.0.0:{os.getenv('PORT', '8000')}")
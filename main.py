@@ -2,16 +2,38 @@
 from dotenv import load_dotenv
 load_dotenv()
 
+import asyncio
+import logging
 import os
-from typing import List, Optional
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List, Optional
+from anyio import to_thread
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from routers.analyzes_router import router as analyzes_router
 from routers.chat_router import router as chat_router
 from routers.documents_router import router as documents_router
 from routers.goals_router import router as goals_router
 
-app = FastAPI(title="Análise de Dados API", version="1.0")
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper())
+logger = logging.getLogger("analyze")
+
+# Event loop baseado em libuv (uvloop); no Windows (dev) segue no loop padrão do asyncio
+try:
+    import uvloop
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+except ImportError:  # pragma: no cover
+    pass
+
+# Threadpool para os serviços síncronos (pandas/LangChain/OpenAI) chamados pelos routers
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    to_thread.current_default_thread_limiter().total_tokens = int(os.getenv("ANALYZE_THREADPOOL_SIZE", "64"))
+    yield
+
+app = FastAPI(title="Análise de Dados API", version="1.0", default_response_class=ORJSONResponse,
+              lifespan=lifespan)
 
 # Configuração de CORS (origens em env, fallback seguro para domínios oficiais)
 def parse_origins(raw: Optional[str]) -> List[str]:
@@ -19,6 +41,12 @@ def parse_origins(raw: Optional[str]) -> List[str]:
         return []
     return [origin.strip() for origin in raw.split(",") if origin.strip()]
 
+def parse_headers(raw: Optional[str]) -> List[str]:
+    # Nomes de header separados por vírgula; vazio/ausente mantém o padrão permissivo
+    if not raw:
+        return ["*"]
+    return [header.strip() for header in raw.split(",") if header.strip()] or ["*"]
+
 default_origins = [
     "http://localhost:3000",
     "http://localhost:3001",
@@ -30,14 +58,20 @@ default_origins = [
 ]
 allow_origins = parse_origins(os.getenv("ANALYZE_ALLOWED_ORIGINS")) or default_origins
 
-print("[analyze] CORS allow_origins =", allow_origins)
+logger.info("CORS allow_origins = %s", allow_origins)
+
+# Métodos explícitos + cache do preflight no navegador (evita um OPTIONS por mensagem do chat).
+# Headers seguem liberados ("*") a menos que ANALYZE_ALLOWED_HEADERS restrinja
+allow_methods = ["GET", "POST", "DELETE", "OPTIONS"]
+allow_headers = parse_headers(os.getenv("ANALYZE_ALLOWED_HEADERS"))
 
 app.add_middleware(
     CORSMiddleware,
     allow_origins=allow_origins,
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_methods=allow_methods,
+    allow_headers=allow_headers,
+    max_age=86400,
 )
 
 # Inclui as rotas do router
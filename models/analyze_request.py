@@ -1,9 +1,12 @@
 # ===== Arquivo: models/analyze_request.py =====
 
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from typing import Optional, List
 
 class AnalyzeRequest(BaseModel):
+    # Imutável após a validação no FastAPI; o schema é construído uma única vez no import
+    model_config = ConfigDict(frozen=True, extra="ignore", populate_by_name=True)
+
     agency_id: str
     client_id: str
     platforms: Optional[List[str]] = None
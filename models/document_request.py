@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from typing import Optional, List, Any, Dict
 from enum import Enum
 
@@ -17,6 +17,8 @@ class UploadType(str, Enum):
 
 
 class DocumentRequest(BaseModel):
+    model_config = ConfigDict(frozen=True, extra="ignore")
+
     documentScope: DocumentScope
     docType: str
     confidentiality: str
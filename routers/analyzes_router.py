@@ -2,7 +2,7 @@
 
 from fastapi import APIRouter
 from models.analyze_request import AnalyzeRequest
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 from services.analyze_service import AnalyzeService
 
 router = APIRouter(prefix="/analyze", tags=["Analyze"])
@@ -10,8 +10,8 @@ router = APIRouter(prefix="/analyze", tags=["Analyze"])
 @router.post("/")
 async def analyze(request: AnalyzeRequest):
     try:
-        service_resp = AnalyzeService.run_analysis(request)
+        service_resp = await AnalyzeService.arun_analysis(request)
         result_text = (service_resp or {}).get("result") or ""
-        return JSONResponse(content={"result": result_text}, status_code=200)
+        return ORJSONResponse(content={"result": result_text}, status_code=200)
     except Exception as e:
-        return JSONResponse(content={"message": str(e)}, status_code=500)
\ No newline at end of file
+        return ORJSONResponse(content={"message": str(e)}, status_code=500)
\ No newline at end of file
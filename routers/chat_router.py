@@ -1,11 +1,15 @@
 # routers/chat_router.py
+import json
 from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, ConfigDict
 from services.chat_service import ChatService
 
 router = APIRouter()
 
 class ChatRequest(BaseModel):
+    model_config = ConfigDict(frozen=True, extra="ignore")
+
     customer_id: int
     client_name: str
     client_id: int
@@ -17,7 +21,7 @@ chat_service = ChatService()
 @router.post("/chat/")
 async def chat_endpoint(request: ChatRequest):
     try:
-        response = chat_service.generate_chat_response(
+        response = await chat_service.generate_chat_response(
             customer_id=request.customer_id,
             client_name=request.client_name,
             client_id=request.client_id,
@@ -26,4 +30,32 @@ async def chat_endpoint(request: ChatRequest):
         )
         return {"response": response}
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/chat/stream")
+async def chat_stream_endpoint(request: ChatRequest):
+    """
+    Mesma conversa do `/chat/`, entregue como Server-Sent Events conforme o modelo gera.
+    Cada evento `data:` traz um trecho de texto (string JSON); o fim é sinalizado por `event: done`.
+    """
+    try:
+        tokens = await chat_service.stream_chat_response(
+            customer_id=request.customer_id,
+            client_name=request.client_name,
+            client_id=request.client_id,
+            prompt=request.prompt,
+            history=request.history
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    async def event_stream():
+        try:
+            async for token in tokens:
+                yield f"data: {json.dumps(token, ensure_ascii=False)}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {json.dumps(str(e), ensure_ascii=False)}\n\n"
+            return
+        yield "event: done\ndata: {}\n\n"
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
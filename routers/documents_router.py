@@ -1,5 +1,6 @@
 # ===== Arquivo: routers/document_router.py =====
 from fastapi import APIRouter, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import Optional
 from models.document_request import (
@@ -27,7 +28,7 @@ class DebugRequest(BaseModel):
 @router.post("/store")
 async def store_document(request: DocumentRequest):
     try:
-        result = DocumentService.store_document(request)
+        result = await run_in_threadpool(DocumentService.store_document, request)
         if result["status"] == "error":
             raise HTTPException(status_code=400, detail=result["message"])
         return result
@@ -50,7 +51,7 @@ async def list_documents(request: DocumentListRequest):
     - `limit`: máximo de registros retornados (1–500, padrão: 50).
     """
     try:
-        result = DocumentService.list_documents(request)
+        result = await run_in_threadpool(DocumentService.list_documents, request)
         if result["status"] == "error":
             raise HTTPException(status_code=400, detail=result.get("message"))
         return result
@@ -68,7 +69,7 @@ async def get_document_details(request: DocumentDetailsRequest):
     O `vector_id` é o ID retornado pelo endpoint `/documents/list`.
     """
     try:
-        result = DocumentService.get_document_details(request)
+        result = await run_in_threadpool(DocumentService.get_document_details, request)
         if result["status"] == "not_found":
             raise HTTPException(status_code=404, detail=result.get("message"))
         if result["status"] == "error":
@@ -88,7 +89,7 @@ async def delete_document(request: DocumentDeleteRequest):
     **Atenção:** a exclusão é permanente e irreversível.
     """
     try:
-        result = DocumentService.delete_document(request)
+        result = await run_in_threadpool(DocumentService.delete_document, request)
         if result["status"] == "error":
             raise HTTPException(status_code=400, detail=result.get("message"))
         return result
@@ -106,7 +107,7 @@ async def delete_documents_batch(request: DocumentDeleteBatchRequest):
     **Atenção:** a exclusão é permanente e irreversível.
     """
     try:
-        result = DocumentService.delete_documents_batch(request)
+        result = await run_in_threadpool(DocumentService.delete_documents_batch, request)
         if result["status"] == "error":
             raise HTTPException(status_code=400, detail=result.get("message"))
         return result
@@ -124,7 +125,8 @@ async def debug_list(request: DebugRequest):
     permitindo identificar problemas de namespace, metadata e query.
     """
     try:
-        result = DocumentService.debug_list(
+        result = await run_in_threadpool(
+            DocumentService.debug_list,
             agency_id=request.agency_id,
             client_id=request.client_id,
             scope=request.scope,
@@ -1,15 +1,18 @@
 # ===== Arquivo: services/analyze_service.py =====
 
-from utils.advanced_data_analyst import AdvancedDataAnalyst
+from utils.deps import get_analyst
 
 class AnalyzeService:
     # Reutilizar o analista (igual st.cache_resource)
-    analyst = AdvancedDataAnalyst()
+    analyst = get_analyst()
 
     @classmethod
     def run_analysis(cls, request):
-        try:
-            payload = request.model_dump()
-        except AttributeError:
-            payload = request.dict()
+        # Request já validado pelo FastAPI: lê os campos direto, sem model_dump()
+        payload = request if isinstance(request, dict) else dict(request)
         return cls.analyst.run_analysis(payload)
+
+    @classmethod
+    async def arun_analysis(cls, request):
+        payload = request if isinstance(request, dict) else dict(request)
+        return await cls.analyst.arun_analysis(payload)
@@ -1,38 +1,94 @@
 # services/chat_service.py
+import asyncio
 import os
-from openai import OpenAI
-from utils.db.vector_db import VectorDBManager
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import AsyncIterator
+from openai import AsyncOpenAI
+from utils.deps import get_analyst
 from utils.prompts.system_prompts import build_chat_system_prompt
 
 
+# Limite de caracteres do contexto recuperado (controla tokens enviados ao LLM)
+CHAT_CONTEXT_MAX_CHARS = int(os.getenv("CHAT_CONTEXT_MAX_CHARS", "12000"))
+
+
+def _join_context(context_docs, max_chars: int = CHAT_CONTEXT_MAX_CHARS) -> str:
+    parts = []
+    remaining = max_chars
+    for doc in context_docs:
+        content = doc.page_content
+        if len(content) >= remaining:
+            parts.append(content[:remaining])
+            break
+        parts.append(content)
+        remaining -= len(content) + 2  # separador "\n\n"
+        if remaining <= 0:
+            break
+    return "\n\n".join(parts)
+
+
+@lru_cache(maxsize=256)
+def _system_message(client_name: str, voice_profile: str, analysis_focus: str) -> dict:
+    # Mensagem de sistema compartilhada entre requisições idênticas (não mutar)
+    return {
+        "role": "system",
+        "content": build_chat_system_prompt(
+            client_name=client_name,
+            voice_profile=voice_profile,
+            analysis_focus=analysis_focus,
+        ),
+    }
+
+
 class ChatService:
     def __init__(self):
-        self.vector_db_manager = VectorDBManager(
-            pinecone_api_key=os.getenv("PINECONE_API_KEY"),
-            openai_api_key=os.getenv("OPENAI_API_KEY")
-        )
-        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        self.vector_db_manager = get_analyst().vector_db
+        self.client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        # Retriever por (customer_id, client_id): evita recriar vector store + retriever a cada turno
+        self._retriever_cache: OrderedDict = OrderedDict()
+        self._retriever_cache_lock = threading.Lock()
+        self._retriever_cache_size = 512
 
-    def generate_chat_response(self, customer_id: int, client_name: str, client_id: int, prompt: str, history: list):
-        vectordb = self.vector_db_manager.create_or_load_vector_db(str(customer_id), str(client_id))
+    def _get_retriever(self, customer_id: int, client_id: int):
+        key = (str(customer_id), str(client_id))
+        with self._retriever_cache_lock:
+            retriever = self._retriever_cache.get(key)
+            if retriever is not None:
+                self._retriever_cache.move_to_end(key)
+                return retriever
 
+        vectordb = self.vector_db_manager.create_or_load_vector_db(*key)
         retriever = vectordb.as_retriever(
             search_type="mmr",
             search_kwargs={"k": 5, "fetch_k": 10}
         )
 
+        with self._retriever_cache_lock:
+            self._retriever_cache[key] = retriever
+            if len(self._retriever_cache) > self._retriever_cache_size:
+                self._retriever_cache.popitem(last=False)
+        return retriever
+
+    def _retrieve_context(self, customer_id: int, client_id: int, prompt: str) -> str:
+        retriever = self._get_retriever(customer_id, client_id)
         context_docs = retriever.invoke(prompt)
-        context_text = "\n\n".join([doc.page_content for doc in context_docs])
+        return _join_context(context_docs)
+
+    async def _build_messages(self, customer_id: int, client_name: str, client_id: int, prompt: str, history: list) -> list:
+        # Pinecone/LangChain são síncronos: a busca roda em thread para não bloquear o event loop.
+        # Como antes, o contexto (limitado a CHAT_CONTEXT_MAX_CHARS) ainda não entra nas mensagens:
+        # enviá-lo ao modelo muda respostas e custo de tokens e fica para uma mudança própria
+        context_text = await asyncio.to_thread(self._retrieve_context, customer_id, client_id, prompt)
 
         openai_messages = []
 
-        system_message = build_chat_system_prompt(
-            client_name=client_name,
-            voice_profile=os.getenv("CHAT_VOICE_PROFILE","CMO"),
-            analysis_focus=os.getenv("CHAT_ANALYSIS_FOCUS", "panorama")  # ou parâmetro
-        )
-        
-        openai_messages.append({"role": "system", "content": system_message})
+        openai_messages.append(_system_message(
+            client_name,
+            os.getenv("CHAT_VOICE_PROFILE", "CMO"),
+            os.getenv("CHAT_ANALYSIS_FOCUS", "panorama"),  # ou parâmetro
+        ))
 
         # Limita o histórico às últimas 8 mensagens
         for msg in history[-8:]:
@@ -40,10 +96,38 @@ class ChatService:
 
         openai_messages.append({"role": "user", "content": prompt})
 
-        response = self.client.chat.completions.create(
+        return openai_messages
+
+    async def generate_chat_response(self, customer_id: int, client_name: str, client_id: int, prompt: str, history: list):
+        openai_messages = await self._build_messages(customer_id, client_name, client_id, prompt, history)
+
+        response = await self.client.chat.completions.create(
             model="gpt-4o",
             messages=openai_messages,
             temperature=0.3
         )
 
         return response.choices[0].message.content
+
+    async def stream_chat_response(self, customer_id: int, client_name: str, client_id: int, prompt: str, history: list) -> AsyncIterator[str]:
+        """
+        Abre o stream no OpenAI e devolve um iterador assíncrono com os trechos de texto.
+        Falhas de retrieval/abertura sobem aqui, antes do primeiro byte da resposta.
+        """
+        openai_messages = await self._build_messages(customer_id, client_name, client_id, prompt, history)
+
+        stream = await self.client.chat.completions.create(
+            model="gpt-4o",
+            messages=openai_messages,
+            temperature=0.3,
+            stream=True
+        )
+
+        async def _tokens() -> AsyncIterator[str]:
+            async for chunk in stream:
+                if chunk.choices:
+                    delta = chunk.choices[0].delta.content
+                    if delta:
+                        yield delta
+
+        return _tokens()
@@ -1,5 +1,5 @@
 # ===== Arquivo: services/document_service.py =====
-from utils.advanced_data_analyst import AdvancedDataAnalyst
+from utils.deps import get_analyst
 from models.document_request import (
     DocumentRequest,
     DocumentListRequest,
@@ -11,12 +11,12 @@ from typing import Dict, Any, Optional
 
 
 class DocumentService:
-    analyst = AdvancedDataAnalyst()
+    analyst = get_analyst()
 
     @classmethod
     def store_document(cls, request: DocumentRequest) -> Dict[str, Any]:
         try:
-            tags_list = [tag.strip() for tag in request.documentTags.split(",")]
+            tags_list = list(filter(None, map(str.strip, request.documentTags.split(","))))
 
             context = {
                 "customer_name": request.customerName,
@@ -38,6 +38,7 @@ class DocumentService:
                 main_category=request.mainCategory,
                 subcategory=request.subcategory,
             )
+            cls.analyst.invalidate_context_cache(request.documentScope.value, request.agency_id, request.client_id)
 
             return {
                 "status": "success",
@@ -113,6 +114,7 @@ class DocumentService:
                 client_id=request.client_id,
                 scope=request.scope.value,
             )
+            cls.analyst.invalidate_context_cache(request.scope.value, request.agency_id, request.client_id)
             return {
                 "status": "success",
                 "deleted_count": 1,
@@ -134,6 +136,7 @@ class DocumentService:
                 client_id=request.client_id,
                 scope=request.scope.value,
             )
+            cls.analyst.invalidate_context_cache(request.scope.value, request.agency_id, request.client_id)
             return {
                 "status": "success",
                 "deleted_count": result["deleted_count"],
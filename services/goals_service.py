@@ -2,9 +2,9 @@
 import math
 from typing import Dict, Any, List, Optional
 
-from utils.advanced_data_analyst import AdvancedDataAnalyst
+from utils.deps import get_analyst
 
-analyst = AdvancedDataAnalyst()
+analyst = get_analyst()
 
 PLATFORM_ALIASES = {
     "ga4": "google_analytics",
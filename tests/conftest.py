@@ -0,0 +1,6 @@
+# tests/conftest.py
+import os
+import sys
+
+# Permite `pytest` na raiz do repositório sem instalar o projeto
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
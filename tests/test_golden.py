@@ -0,0 +1,174 @@
+# tests/test_golden.py
+"""
+Resumos, consulta RAG e mensagens do LLM comparados com saídas de referência em tests/golden/.
+Os casos sem empates e com dados foram gerados pela implementação original (pandas linha a linha):
+as otimizações precisam reproduzi-los. Para regenerar após uma mudança intencional:
+    UPDATE_GOLDEN=1 python -m pytest tests/test_golden.py
+"""
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.advanced_data_analyst import PLATFORM_SCHEMA, AdvancedDataAnalyst
+
+GOLDEN_DIR = Path(__file__).parent / "golden"
+UPDATE_GOLDEN = bool(os.getenv("UPDATE_GOLDEN"))
+
+
+def _platform_frame(platform: str, seed: int, n: int, *, start: str = "2024-01-01", gaps: bool = False,
+                    nan_frac: float = 0.0, tz: bool = False, duplicate: bool = False,
+                    ties: bool = False, fractional: bool = False) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(start, periods=n, freq="D")
+    if gaps:
+        dates = dates[rng.random(n) > 0.2]
+    m = len(dates)
+    data: Dict[str, Any] = {"data": dates.tz_localize("UTC") if tz else dates.strftime("%Y-%m-%d")}
+    for col in PLATFORM_SCHEMA[platform]:
+        if ties:
+            # Poucos valores distintos (int64, como vem do banco): empates no topo
+            data[col] = rng.integers(0, 4, m).astype(np.int64)
+            continue
+        # Valores distintos: o top-3 não depende de desempate
+        values = (rng.permutation(m * 7)[:m] * 13 + 101).astype(np.float64)
+        if fractional:
+            # Não inteiros: somas/médias dependem da ordem e do tipo de soma (pareada x compensada)
+            values = values * 0.137 + rng.random(m)
+        if m:
+            values[rng.integers(0, m)] = 50_000.0  # pico para as anomalias
+        if nan_frac:
+            values[rng.random(m) < nan_frac] = np.nan
+        data[col] = values
+    df = pd.DataFrame(data)
+    if duplicate and m > 2:
+        df = pd.concat([df, df.iloc[:1]], ignore_index=True)
+    return df
+
+
+CASES: Dict[str, Dict[str, Any]] = {
+    "instagram_basic": {
+        "platforms": ["instagram"],
+        "frames": lambda: {"instagram": _platform_frame("instagram", 1, 30)},
+    },
+    "multi_platform_gaps": {
+        "platforms": ["facebook", "instagram", "linkedin"],
+        "frames": lambda: {
+            "facebook": _platform_frame("facebook", 2, 45, gaps=True, nan_frac=0.1),
+            "instagram": _platform_frame("instagram", 3, 45, start="2024-01-03", gaps=True, nan_frac=0.1),
+            "linkedin": _platform_frame("linkedin", 4, 40, start="2024-01-02", gaps=True),
+        },
+    },
+    "tz_duplicates": {
+        "platforms": ["google_analytics"],
+        "frames": lambda: {"google_analytics": _platform_frame("google_analytics", 5, 21, tz=True, duplicate=True)},
+    },
+    "fractional_values": {
+        "platforms": ["facebook", "instagram"],
+        "frames": lambda: {
+            "facebook": _platform_frame("facebook", 8, 120, gaps=True, nan_frac=0.1, fractional=True),
+            "instagram": _platform_frame("instagram", 9, 120, start="2024-01-02", fractional=True),
+        },
+    },
+    "single_day": {
+        "platforms": ["instagram"],
+        "frames": lambda: {"instagram": _platform_frame("instagram", 6, 1)},
+    },
+    # Casos com comportamento definido pela versão otimizada (não pela original):
+    # empates listam a data mais antiga primeiro; sem linhas, o resumo sai como esqueleto vazio
+    "ties": {
+        "platforms": ["instagram"],
+        "frames": lambda: {"instagram": _platform_frame("instagram", 7, 60, ties=True)},
+    },
+    "empty": {
+        "platforms": ["instagram"],
+        "frames": lambda: {"instagram": pd.DataFrame({"data": [], "reach": []})},
+    },
+}
+
+
+class _FakeRelationalDB:
+    def __init__(self, frames: Dict[str, pd.DataFrame]):
+        self.frames = frames
+
+    def get_client_data(self, client_id, platform, start_date, end_date):
+        return self.frames[platform].copy()
+
+
+class _FakeVectorDB:
+    def __init__(self):
+        self.queries: List[str] = []
+
+    def retrieve_context_for_analysis(self, query, scope, agency_id, client_id=None, k_total=8):
+        self.queries.append(query)
+        return "[relatorio • sistema] Alcance de fevereiro ficou estável."
+
+
+class _Msg:
+    def __init__(self, content: str):
+        self.content = content
+
+
+class _RecordingLLM:
+    def __init__(self):
+        self.calls: List[List[Dict[str, str]]] = []
+
+    def invoke(self, msgs):
+        self.calls.append(msgs)
+        return _Msg("Em 2024-01-05 o alcance chegou a 50000, acima da média do período.")
+
+
+def _run_case(name: str) -> Dict[str, Any]:
+    case = CASES[name]
+    vector_db = _FakeVectorDB()
+    llm = _RecordingLLM()
+    analyst = AdvancedDataAnalyst(vector_db=vector_db, relational_db=_FakeRelationalDB(case["frames"]()),
+                                  openai_api_key="x")
+    analyst._llm = llm
+    response = analyst.run_analysis({
+        "agency_id": "10",
+        "client_id": "20",
+        "platforms": case["platforms"],
+        "output_format": "detalhado",
+    })
+    assert response["status"] == "success", response["error"]
+    return {
+        "summary": json.loads(json.dumps(response["summary"], default=str)),
+        "rag_queries": vector_db.queries,
+        "messages": [[{"role": m["role"], "content": m["content"]} for m in call] for call in llm.calls],
+        "result": response["result"],
+    }
+
+
+@pytest.mark.parametrize("name", sorted(CASES))
+def test_analysis_matches_golden(name):
+    out = _run_case(name)
+    golden_path = GOLDEN_DIR / f"{name}.json"
+    if UPDATE_GOLDEN:
+        GOLDEN_DIR.mkdir(exist_ok=True)
+        golden_path.write_text(json.dumps(out, ensure_ascii=False, indent=1) + "\n", encoding="utf-8")
+    golden = json.loads(golden_path.read_text(encoding="utf-8"))
+
+    # Igualdade exata (floats inclusive): o resumo vai para o payload da API e, serializado, para o prompt
+    assert out["summary"] == golden["summary"]
+    assert out["rag_queries"] == golden["rag_queries"]
+    assert out["messages"] == golden["messages"]
+    assert out["result"] == golden["result"]
+
+
+def test_ties_golden_lists_earliest_dates_first():
+    golden = json.loads((GOLDEN_DIR / "ties.json").read_text(encoding="utf-8"))
+    for top in golden["summary"]["highlights"].values():
+        for a, b in zip(top, top[1:]):
+            assert a["value"] > b["value"] or (a["value"] == b["value"] and a["date"] < b["date"])
+
+
+def test_empty_golden_is_an_empty_skeleton():
+    summary = json.loads((GOLDEN_DIR / "empty.json").read_text(encoding="utf-8"))["summary"]
+    assert summary["period"] == {"start": None, "end": None}
+    assert summary["kpis"] == {} and summary["highlights"] == {}
+    assert summary["meta"]["selected_metrics"] == []
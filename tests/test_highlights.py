@@ -0,0 +1,52 @@
+# tests/test_highlights.py
+import numpy as np
+import pandas as pd
+
+from utils.advanced_data_analyst import (
+    AdvancedDataAnalyst,
+    _downcast_numeric,
+    _highlights_and_variance_hint,
+)
+
+
+def _tied_frame(n: int = 60) -> pd.DataFrame:
+    rng = np.random.default_rng(7)
+    return pd.DataFrame({
+        "data": pd.date_range("2024-01-01", periods=n),
+        # Poucos valores distintos: muitos empates no topo
+        "instagram_reach": rng.integers(0, 4, n).astype(np.int64),
+        "instagram_views": rng.integers(0, 3, n).astype(np.float64) * 10.0,
+    })
+
+
+def test_tied_highlights_do_not_depend_on_dtype():
+    df = _tied_frame()
+    downcast = _downcast_numeric(df)
+    assert downcast["instagram_reach"].dtype == np.int8
+
+    expected, _ = _highlights_and_variance_hint(df)
+    for variant in (downcast, df.astype({"instagram_reach": np.float64}), df.iloc[::-1]):
+        got, _ = _highlights_and_variance_hint(variant)
+        assert got == expected
+
+
+def test_tied_highlights_keep_earliest_dates_first():
+    df = pd.DataFrame({
+        "data": pd.to_datetime(["2024-01-05", "2024-01-01", "2024-01-03", "2024-01-02", "2024-01-04"]),
+        "instagram_reach": np.array([9, 9, 5, 9, 9], dtype=np.int16),
+    })
+    highlights, _ = _highlights_and_variance_hint(df)
+    assert highlights["instagram_reach"] == [
+        {"date": "2024-01-01", "value": 9.0},
+        {"date": "2024-01-02", "value": 9.0},
+        {"date": "2024-01-04", "value": 9.0},
+    ]
+
+
+def test_enrich_summary_fallback_matches_vectorized_highlights():
+    df = _tied_frame()
+    expected, vh = _highlights_and_variance_hint(df)
+    analyst = AdvancedDataAnalyst.__new__(AdvancedDataAnalyst)
+    enriched = analyst._enrich_summary(_downcast_numeric(df), ["instagram"], {"meta": {}})
+    assert enriched["highlights"] == expected
+    assert enriched["meta"]["variance_hint"] == vh
@@ -0,0 +1,85 @@
+# tests/test_narrative_inflight.py
+import asyncio
+
+import pytest
+
+from utils.advanced_data_analyst import AdvancedDataAnalyst
+
+NARRATIVE_ARGS = (["instagram"], "descriptive", "pergunta", "", {"kpis": {}}, "topicos")
+
+
+class _Msg:
+    def __init__(self, content: str):
+        self.content = content
+
+
+class _SlowLLM:
+    def __init__(self, content: str = "Alcance subiu em 2024-01-02 para 123."):
+        self.content = content
+        self.calls = 0
+
+    async def ainvoke(self, msgs):
+        self.calls += 1
+        await asyncio.sleep(0.05)
+        return _Msg(self.content)
+
+
+def _analyst(llm) -> AdvancedDataAnalyst:
+    analyst = AdvancedDataAnalyst(vector_db=object(), relational_db=object(), openai_api_key="x")
+    analyst._llm = llm
+    return analyst
+
+
+def test_concurrent_requests_share_one_llm_call():
+    llm = _SlowLLM()
+    analyst = _analyst(llm)
+
+    async def main():
+        return await asyncio.gather(*(analyst._amake_narrative(*NARRATIVE_ARGS) for _ in range(3)))
+
+    results = asyncio.run(main())
+    assert len(set(results)) == 1
+    single = _SlowLLM()
+    asyncio.run(_analyst(single)._amake_narrative(*NARRATIVE_ARGS))
+    assert llm.calls == single.calls
+    assert analyst._narrative_inflight == {}
+
+
+def test_leader_cancellation_does_not_cancel_followers():
+    llm = _SlowLLM()
+    analyst = _analyst(llm)
+
+    async def main():
+        leader = asyncio.create_task(analyst._amake_narrative(*NARRATIVE_ARGS))
+        await asyncio.sleep(0.01)
+        follower = asyncio.create_task(analyst._amake_narrative(*NARRATIVE_ARGS))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower
+
+    out = asyncio.run(main())
+    assert "2024-01-02" in out
+    assert analyst._narrative_inflight == {}
+    # O seguidor assumiu como líder e refez a chamada ao LLM
+    assert llm.calls >= 2
+
+
+def test_leader_failure_propagates_to_followers():
+    class _Boom:
+        async def ainvoke(self, msgs):
+            await asyncio.sleep(0.02)
+            raise RuntimeError("boom")
+
+    analyst = _analyst(_Boom())
+
+    async def main():
+        return await asyncio.gather(
+            *(analyst._amake_narrative(*NARRATIVE_ARGS) for _ in range(2)),
+            return_exceptions=True,
+        )
+
+    results = asyncio.run(main())
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert analyst._narrative_inflight == {}
@@ -0,0 +1,88 @@
+# tests/test_summary_cache.py
+import numpy as np
+import pandas as pd
+
+from utils.advanced_data_analyst import AdvancedDataAnalyst
+
+
+class _FakeRelationalDB:
+    def __init__(self):
+        self.calls = []
+
+    def get_client_data(self, client_id, platform, start_date, end_date):
+        self.calls.append((client_id, platform))
+        n = 10
+        return pd.DataFrame({
+            "data": pd.date_range("2024-03-01", periods=n).strftime("%Y-%m-%d"),
+            "reach": np.arange(n, dtype=np.int64) * (3 if platform == "facebook" else 5),
+            "impressions": np.arange(n, dtype=np.int64) * 7,
+        })
+
+
+def _analyst():
+    rel_db = _FakeRelationalDB()
+    return AdvancedDataAnalyst(vector_db=object(), relational_db=rel_db, openai_api_key="x"), rel_db
+
+
+def test_platform_order_shares_cached_summary():
+    analyst, rel_db = _analyst()
+    first, first_text = analyst._get_summary("1", "2", ["instagram", "facebook"], None, None)
+    second, second_text = analyst._get_summary("1", "2", ["facebook", "instagram"], None, None)
+
+    assert second is first
+    assert second_text == first_text
+    assert first["meta"]["platforms"] == ["facebook", "instagram"]
+    assert len(rel_db.calls) == 2
+
+
+def test_summary_cache_is_scoped_by_agency():
+    analyst, _ = _analyst()
+    first, _ = analyst._get_summary("1", "2", ["instagram"], None, None)
+    other, _ = analyst._get_summary("9", "2", ["instagram"], None, None)
+
+    assert other is not first
+    assert len(analyst.clients_cache) == 2
+
+
+class _FakeVectorDB:
+    def __init__(self):
+        self.queries = []
+
+    def retrieve_context_for_analysis(self, query, scope, agency_id, client_id=None, k_total=8):
+        self.queries.append(query)
+        return ""
+
+
+class _Msg:
+    def __init__(self, content):
+        self.content = content
+
+
+class _RecordingLLM:
+    def __init__(self):
+        self.calls = []
+
+    def invoke(self, msgs):
+        self.calls.append([m["content"] for m in msgs])
+        return _Msg("Alcance subiu em 2024-03-02 para 123.")
+
+
+def _run(platforms):
+    vector_db, llm = _FakeVectorDB(), _RecordingLLM()
+    analyst = AdvancedDataAnalyst(vector_db=vector_db, relational_db=_FakeRelationalDB(), openai_api_key="x")
+    analyst._llm = llm
+    response = analyst.run_analysis({"agency_id": "1", "client_id": "2", "platforms": platforms})
+    return response, vector_db.queries, llm.calls
+
+
+def test_request_order_does_not_change_payload_rag_or_prompt():
+    forward = _run(["facebook", "instagram"])
+    backward = _run(["instagram", "facebook"])
+
+    response, queries, calls = backward
+    assert response["platforms"] == ["facebook", "instagram"]
+    assert response["summary"]["meta"]["platforms"] == ["facebook", "instagram"]
+    assert response["summary"] == forward[0]["summary"]
+    assert response["query"] == forward[0]["query"]
+    assert queries == forward[1]
+    assert calls == forward[2]
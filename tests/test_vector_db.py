@@ -0,0 +1,146 @@
+# tests/test_vector_db.py
+from langchain_pinecone import PineconeVectorStore
+
+from utils.db.vector_db import VectorDBManager
+
+
+class _FakeEmbeddings:
+    model = "fake-embedding"
+
+    def __init__(self):
+        self.embedded = []
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return [[float(len(t)), 1.0] for t in texts]
+
+    def embed_query(self, text):
+        return [float(len(text)), 1.0]
+
+
+class _Done:
+    def get(self):
+        return None
+
+
+class _FakeIndex:
+    def __init__(self):
+        self.upserts = []
+        self.records = {}  # (namespace, id) -> metadata, como o Pinecone guarda após o upsert
+
+    def upsert(self, vectors, namespace=None, **kwargs):
+        vectors = list(vectors)
+        self.upserts.append((namespace, vectors))
+        for vid, _, md in vectors:
+            self.records[(namespace, vid)] = md
+        return _Done()
+
+
+def _manager(namespace: str):
+    manager = VectorDBManager(pinecone_api_key="pc-test", openai_api_key="oa-test")
+    embeddings = _FakeEmbeddings()
+    index = _FakeIndex()
+    manager._embeddings = embeddings
+    manager._store_cache[namespace] = PineconeVectorStore(
+        index=index, embedding=manager.document_embeddings, namespace=namespace, text_key="text"
+    )
+    return manager, embeddings, index
+
+
+def _store(manager: VectorDBManager, content: str, author: str = "analista"):
+    manager.store_document(
+        content=content,
+        scope="client",
+        doc_type="relatorio",
+        source="upload_usuario",
+        agency_id="7",
+        client_id="42",
+        author=author,
+    )
+
+
+def test_reupload_hits_embedding_cache_and_keeps_both_records():
+    manager, embeddings, index = _manager("client_7_42")
+    content = "Relatório de março: alcance cresceu 12%."
+
+    _store(manager, content)
+    _store(manager, content, author="outra pessoa")
+
+    # Segundo upload não volta ao provedor de embeddings
+    assert embeddings.embedded == [content]
+
+    assert len(index.upserts) == 2
+    (ns1, [(id1, vec1, md1)]), (ns2, [(id2, vec2, md2)]) = index.upserts
+    assert ns1 == ns2 == "client_7_42"
+    assert vec1 == vec2 == [float(len(content)), 1.0]
+    assert md1["text"] == md2["text"] == content
+    assert md1["doc_type"] == "relatorio"
+    assert md1["agency_id"] == "7" and md1["client_id"] == "42"
+    assert md1["created_at"].endswith("Z")
+
+    # Uploads distintos continuam registros distintos, cada um com a própria metadata
+    assert id1 != id2
+    assert len(index.records) == 2
+    assert index.records[(ns1, id1)]["author"] == "analista"
+    assert index.records[(ns2, id2)]["author"] == "outra pessoa"
+
+
+def test_bulk_store_embeds_only_new_texts():
+    from langchain.schema import Document
+
+    manager, embeddings, index = _manager("client_7_42")
+    _store(manager, "texto já enviado")
+
+    ids = manager.store_documents_bulk(
+        [Document(page_content="texto já enviado", metadata={"doc_type": "analise"}),
+         Document(page_content="texto novo", metadata={"doc_type": "analise"})],
+        scope="client",
+        agency_id="7",
+        client_id="42",
+    )
+
+    assert len(set(ids)) == 2
+    assert embeddings.embedded == ["texto já enviado", "texto novo"]
+    assert len(index.records) == 3
+    assert manager.store_documents_bulk([], scope="client", agency_id="7", client_id="42") == []
+
+
+class _FakeSearchStore:
+    def __init__(self, per_pass: int):
+        self.per_pass = per_pass
+        self.calls = []
+
+    def max_marginal_relevance_search_by_vector(self, embedding, k, fetch_k, lambda_mult, filter=None):
+        from langchain.schema import Document
+
+        self.calls.append((k, filter))
+        label = "geral" if filter is None else filter["$and"][0]["doc_type"]["$in"][0]
+        n = k if filter is None else min(k, self.per_pass)
+        return [Document(page_content=f"{label} {i}", metadata={"doc_type": label}) for i in range(n)]
+
+
+def _search_manager(per_pass: int):
+    manager = VectorDBManager(pinecone_api_key="pc-test", openai_api_key="oa-test")
+    manager._embeddings = _FakeEmbeddings()
+    store = _FakeSearchStore(per_pass)
+    manager._store_cache["client_7_42"] = store
+    return manager, store
+
+
+def test_fallback_pass_skipped_when_filtered_passes_fill_k():
+    manager, store = _search_manager(per_pass=3)
+    context = manager.retrieve_context_for_analysis("alcance", scope="client", agency_id="7",
+                                                    client_id="42", k_total=6)
+
+    assert len(store.calls) == 2
+    assert all(f is not None for _, f in store.calls)
+    assert "geral" not in context
+
+
+def test_fallback_pass_fills_the_remaining_slots():
+    manager, store = _search_manager(per_pass=1)
+    context = manager.retrieve_context_for_analysis("alcance", scope="client", agency_id="7",
+                                                    client_id="42", k_total=8)
+
+    assert (6, None) in store.calls
+    assert context.count("\ngeral ") == 6
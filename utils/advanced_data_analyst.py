@@ -1,10 +1,22 @@
 from __future__ import annotations
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
 from dataclasses import dataclass
 from datetime import datetime
-from typing import Any, Callable, Dict, List, Optional
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import asyncio
+import hashlib
+import json
 import os
+import re
+import threading
+import time
+import warnings
 import numpy as np
+import orjson
 import pandas as pd
+from cachetools import TTLCache
 from utils.db.relational_db import RelationalDBManager
 from utils.db.vector_db import VectorDBManager
 from utils.prompts.system_prompts import (
@@ -51,6 +63,34 @@ PREFERRED_BASES = (
     "reach", "views", "impressions", "followers",
     "traffic_direct", "traffic_organic_search", "traffic_organic_social", "search_volume"
 )
+# Cache de resumo por agência + cliente + plataformas + período. Dados novos no banco relacional
+# aparecem em até CLIENTS_CACHE_TTL_SECONDS (padrão 15 min); ANALYZE_CACHE_TTL_SECONDS=0 desativa o cache
+CLIENTS_CACHE_MAXSIZE = 128
+CLIENTS_CACHE_TTL_SECONDS = int(os.getenv("ANALYZE_CACHE_TTL_SECONDS", "900"))
+# Cache de DFs por plataforma limitado por bytes (não por entradas): frames grandes não expulsam dezenas de pequenos
+PLATFORM_DF_CACHE_MAX_BYTES = int(os.getenv("ANALYZE_PLATFORM_DF_CACHE_BYTES", str(256 * 1024 * 1024)))
+NARRATIVE_CACHE_MAXSIZE = 256
+# Heurísticas de texto "genérico" e quebra de frases (compiladas uma única vez)
+_HAS_NUMBER_RE = re.compile(r"\d{2}/\d{2}|\d{4}-\d{2}-\d{2}|\b\d{2,}[.,]?\d*\b")
+_HAS_DATE_RE = re.compile(r"\b\d{1,2}/\d{1,2}\b|\b\d{4}-\d{2}-\d{2}\b")
+_SENTENCE_SPLIT_RE = re.compile(r'(?<=[.!?])\s+')
+# Contexto RAG por (agência, cliente, query): invalidado quando documentos mudam, mas só no worker
+# que atendeu a escrita; nos demais o TTL (o mesmo das narrativas, 15 min) limita a defasagem
+CONTEXT_CACHE_MAXSIZE = 512
+CONTEXT_CACHE_TTL_SECONDS = int(os.getenv("ANALYZE_CONTEXT_CACHE_TTL_SECONDS", str(CLIENTS_CACHE_TTL_SECONDS)))
+# Consultas por plataforma em paralelo (I/O de banco libera o GIL)
+PLATFORM_LOAD_MAX_WORKERS = int(os.getenv("ANALYZE_PLATFORM_LOAD_WORKERS", "8"))
+
+# Mapa origem -> nome final (canônico já prefixado), montado uma vez a partir do schema
+_PLATFORM_RENAME: Dict[str, Dict[str, str]] = {
+    platform: {
+        orig: (canon if canon.startswith(f"{platform}_") else f"{platform}_{canon}")
+        for orig, canon in schema.items()
+    }
+    for platform, schema in PLATFORM_SCHEMA.items()
+}
+_PLATFORM_PREFIX: Dict[str, str] = {platform: f"{platform}_" for platform in PLATFORM_SCHEMA}
+_TECHNICAL_COLUMNS = frozenset({"id_customer", "agency_id", "client_id"})
 
 
 # =============================
@@ -58,30 +98,28 @@ PREFERRED_BASES = (
 # =============================
 
 def _normalize_platform_df(df: pd.DataFrame, platform: str) -> pd.DataFrame:
-    out = df.copy()
-
-    # 1) Uniformizar nome da coluna de data
-    if "data" not in out.columns and "date" in out.columns:
-        out = out.rename(columns={"date": "data"})
-
-    # 2) Remover campos técnicos que não serão agregados por dia
-    drop_candidates = [c for c in out.columns if c.lower() in {"id_customer", "agency_id", "client_id"}]
-    if drop_candidates:
-        out = out.drop(columns=drop_candidates, errors="ignore")
-
-    # 3) Aplicar mapeamento canônico específico da plataforma
-    schema = PLATFORM_SCHEMA.get(platform, {})
-    out = out.rename(columns={orig: canon for orig, canon in schema.items() if orig in out.columns})
-
-    # 4) Prefixar com o nome da plataforma, preservando 'data'
-    ren = {}
+    # 1) Remover campos técnicos que não serão agregados por dia (drop já devolve um DF novo).
+    #    Sem drop, cópia rasa basta: só o rótulo das colunas muda e a 'data' é substituída depois
+    drop_candidates = [c for c in df.columns if c.lower() in _TECHNICAL_COLUMNS]
+    out = df.drop(columns=drop_candidates) if drop_candidates else df.copy(deep=False)
+
+    # 2) Uniformizar 'date' -> 'data', aplicar mapeamento canônico e prefixar com a plataforma
+    #    numa única passada pelos nomes (sem montar dicts de rename por chamada)
+    rename = _PLATFORM_RENAME.get(platform, {})
+    prefix = _PLATFORM_PREFIX.get(platform) or f"{platform}_"
+    date_col = "date" if "data" not in out.columns else None
+    new_cols = []
     for col in out.columns:
-        if col == "data":
-            continue
-        if not col.startswith(f"{platform}_"):
-            ren[col] = f"{platform}_{col}"
-    if ren:
-        out = out.rename(columns=ren)
+        if col == date_col or col == "data":
+            new_cols.append("data")
+        elif col in rename:
+            new_cols.append(rename[col])
+        elif col.startswith(prefix):
+            new_cols.append(col)
+        else:
+            new_cols.append(prefix + col)
+    if new_cols != list(out.columns):
+        out.columns = new_cols
 
     return out
 
@@ -90,85 +128,333 @@ def _prepare_dates(df: pd.DataFrame, tz: str = "America/Sao_Paulo") -> pd.DataFr
     Garante 'data' normalizada ao dia (sem deslocar quando a origem é apenas YYYY-MM-DD).
     - Se vier timezone-aware, converte para tz local e remove tz.
     - Se vier naive (somente data), apenas normaliza.
+    Altera a coluna 'data' do DF recebido (o chamador já passa uma cópia normalizada).
     """
-    out = df.copy()
-    s = pd.to_datetime(out["data"], errors="coerce")
+    s = df["data"]
+    if not pd.api.types.is_datetime64_any_dtype(s):
+        s = pd.to_datetime(s, errors="coerce")
 
     # Se a série tiver timezone (alguns itens podem ser tz-aware, outros não)
-    if getattr(s.dt, "tz", None) is not None:
+    if isinstance(s.dtype, pd.DatetimeTZDtype):
         s = s.dt.tz_convert(tz).dt.tz_localize(None)
 
-    out["data"] = s.dt.normalize()
-    out = out.sort_values("data").reset_index(drop=True)
+    s = s.dt.normalize()
+    df["data"] = s
+
+    # Já ordenado e sem empates: o sort seria identidade, só reindexa
+    if s.is_monotonic_increasing and s.is_unique:
+        df.index = pd.RangeIndex(len(df))
+        return df
+    return df.sort_values("data", ignore_index=True)
+
+def _downcast_numeric(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Reduz int64/float64 para o menor tipo que preserva os valores (ex.: int32/float32).
+    Usado nos DFs guardados em cache; as reduções do resumo continuam acumulando em float64.
+    """
+    downcast: Dict[str, pd.Series] = {}
+    for c in df.columns:
+        s = df[c]
+        if pd.api.types.is_integer_dtype(s):
+            downcast[c] = pd.to_numeric(s, downcast="integer")
+        elif s.dtype == np.float64:
+            # Só vira float32 se a conversão for exata (contagens inteiras < 2**24 etc.)
+            a = s.to_numpy()
+            a32 = a.astype(np.float32)
+            if np.array_equal(a32, a, equal_nan=True):
+                downcast[c] = pd.Series(a32, index=s.index, name=c)
+    if not downcast:
+        return df
+    out = df.copy(deep=False)
+    for c, s in downcast.items():
+        out[c] = s
     return out
 
+def _frame_nbytes(df: pd.DataFrame) -> int:
+    # Custo no cache: bytes das colunas e do índice (colunas numéricas/datetime, sem objetos)
+    return int(df.memory_usage(index=True, deep=False).sum()) or 1
+
+def _upcast_float32(df: pd.DataFrame) -> pd.DataFrame:
+    # Reduções do pandas em float32 acumulam em float32: o resumo é sempre calculado em float64
+    cols = [c for c in df.columns if df[c].dtype == np.float32]
+    return df.astype({c: np.float64 for c in cols}) if cols else df
+
+@lru_cache(maxsize=64)
+def _candidate_columns(platforms: Tuple[str, ...]) -> Tuple[str, ...]:
+    # Nomes "<plataforma>_<base>" possíveis para a combinação de plataformas, calculados uma vez
+    return tuple(f"{p}_{base}" for base in PREFERRED_BASES for p in platforms)
+
 def _basic_kpis(df: pd.DataFrame, cols: List[str]) -> Dict[str, Dict[str, float]]:
-    kpis: Dict[str, Dict[str, float]] = {}
-    for c in cols:
-        if c in df.columns:
-            s = df[c].fillna(0)
-            kpis[c] = {
-                "mean": float(s.mean()),
-                "median": float(s.median()),
-                "p95": float(s.quantile(0.95)),
-                "sum": float(s.sum()),
-                "non_zero_days": float((s > 0).sum()),
-                "days": float(s.shape[0]),
-            }
-    return kpis
+    present = [c for c in cols if c in df.columns]
+    if not present:
+        return {}
+    return _basic_kpis_arr(df[present].fillna(0).to_numpy(dtype=np.float64), present)
+
+def _basic_kpis_arr(sub: np.ndarray, present: List[str]) -> Dict[str, Dict[str, float]]:
+    # Uma matriz (dias x métricas, ausentes = 0) e cada estatística calculada para todas as colunas de uma vez
+    if not present:
+        return {}
+    days = sub.shape[0]
+    if days:
+        means = sub.mean(axis=0)
+        # Mediana e p95 numa única partição (np.median + np.percentile particionariam duas vezes)
+        medians, p95s = np.percentile(sub, (50, 95), axis=0)
+    else:
+        means = medians = p95s = np.full(len(present), np.nan)
+    sums = sub.sum(axis=0)
+    non_zero = (sub > 0).sum(axis=0)
+
+    return {
+        c: {
+            "mean": float(means[i]),
+            "median": float(medians[i]),
+            "p95": float(p95s[i]),
+            "sum": float(sums[i]),
+            "non_zero_days": float(non_zero[i]),
+            "days": float(days),
+        }
+        for i, c in enumerate(present)
+    }
 
 def _mad_anomalies(df: pd.DataFrame, col: str, zcut: float = 3.0) -> List[Dict[str, Any]]:
     if col not in df.columns:
         return []
     # Mantém apenas valores numéricos válidos; ausentes após merge entre plataformas
     # não devem virar outliers nem ser convertidos para float.
-    s = pd.to_numeric(df[col], errors="coerce")
-    valid_mask = s.notna()
-    if valid_mask.sum() == 0:
-        return []
-    s_valid = s.loc[valid_mask]
-    med = s_valid.median()
-    mad = (s_valid - med).abs().median()
-    if mad == 0 or pd.isna(mad):
-        return []
+    values = pd.to_numeric(df[col], errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+    return _mad_anomalies_arr(df["data"].to_numpy(dtype="datetime64[ns]"), values, col, zcut)
 
-    z = 0.6745 * (s_valid - med) / mad
-    outlier_idx = z.loc[z.abs() >= zcut].index
-    outliers = df.loc[outlier_idx, ["data", col]].copy()
-    outliers[col] = pd.to_numeric(outliers[col], errors="coerce")
-    outliers = outliers.dropna(subset=["data", col])
+def _mad_anomalies_arr(dates: np.ndarray, values: np.ndarray, col: str, zcut: float = 3.0) -> List[Dict[str, Any]]:
+    return _mad_anomalies_mat(dates, values[:, None], [col], zcut)[col]
 
-    records: List[Dict[str, Any]] = []
-    for _, row in outliers.iterrows():
-        records.append({"data": str(row["data"].date()), col: float(row[col])})
-    return records
+def _mad_anomalies_mat(dates: np.ndarray,
+                       values: np.ndarray,
+                       cols: List[str],
+                       zcut: float = 3.0) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Anomalias por MAD para todas as métricas de uma vez.
+    values: matriz (linhas x métricas) com NaN nos ausentes; dates: datetime64 alinhado às linhas.
+    """
+    out: Dict[str, List[Dict[str, Any]]] = {c: [] for c in cols}
+    n_valid = (~np.isnan(values)).sum(axis=0)
+    live = np.flatnonzero(n_valid)
+    if not live.size:
+        return out
+    sub = values[:, live]
+    n = n_valid[live]
+    cidx = np.arange(live.size)
+    lo, hi = (n - 1) // 2, n // 2
+
+    # Mediana e MAD por coluna com um sort da matriz (NaN vão para o fim): os elementos centrais
+    # entre os n válidos, com a mesma média dos dois centrais do np.median (bit a bit)
+    srt = np.sort(sub, axis=0)
+    med = (srt[lo, cidx] + srt[hi, cidx]) / 2
+    dev = sub - med
+    np.abs(dev, out=dev)
+    srt = np.sort(dev, axis=0)
+    mad = (srt[lo, cidx] + srt[hi, cidx]) / 2
+
+    # z robusto no buffer dos desvios (|0.6745·(x−med)/mad| ≡ 0.6745·|x−med|/mad, bit a bit);
+    # NaN nunca satisfaz >= zcut, então ausentes ficam fora da máscara
+    dev *= 0.6745
+    with np.errstate(divide="ignore", invalid="ignore"):
+        dev /= mad
+        mask = dev >= zcut
+    mask &= ~np.isnat(dates)[:, None]
+    mask[:, mad == 0] = False
+    if not mask.any():
+        return out
+
+    # Datas formatadas de uma vez (YYYY-MM-DD) para todas as linhas marcadas
+    rows = np.flatnonzero(mask.any(axis=1))
+    day_of = dict(zip(rows.tolist(), np.datetime_as_string(dates[rows], unit="D").tolist()))
+    for k in np.flatnonzero(mask.any(axis=0)).tolist():
+        col = cols[live[k]]
+        hit = np.flatnonzero(mask[:, k])
+        out[col] = [{"data": day_of[r], col: x} for r, x in zip(hit.tolist(), sub[hit, k].tolist())]
+    return out
+
+def _top_n_desc(dates: np.ndarray,
+                values: np.ndarray,
+                valid: np.ndarray,
+                n: int = 3) -> List[Dict[str, Any]]:
+    """
+    Top-n por valor (float64), em ordem decrescente. Empates ficam na ordem das linhas
+    (cronológica: a data mais antiga primeiro), independente do dtype da coluna de origem.
+    valid: linhas com data e valor presentes.
+    """
+    idx = np.flatnonzero(valid)
+    if not idx.size:
+        return []
+    top = idx[np.argsort(-values[idx], kind="stable")[:n]]
+    day_strs = np.datetime_as_string(dates[top], unit="D").tolist()
+    return [{"date": d, "value": v} for d, v in zip(day_strs, values[top].tolist())]
+
+def _highlights_and_variance_hint(df: pd.DataFrame) -> Tuple[Dict[str, List[Dict[str, Any]]], str]:
+    """
+    Top 3 por métrica numérica (com data) e variance_hint 'baixa' | 'media' | 'alta'
+    (gating de few-shots), sobre as linhas com data válida em ordem cronológica.
+    """
+    metric_cols = [c for c in df.columns if c != "data" and _is_number_dtype(df[c].dtype)]
+    if not metric_cols:
+        return {}, "media"
+
+    dates = pd.to_datetime(df["data"], errors="coerce").to_numpy(dtype="datetime64[ns]")
+    keep = np.flatnonzero(~np.isnat(dates))
+    # Mesma permutação de dropna(subset=["data"]).sort_values("data", kind="stable")
+    perm = keep[dates[keep].argsort(kind="stable")]
+    dates = dates[perm]
+    # Todas as métricas numa matriz (linhas em ordem cronológica x métricas)
+    values = df[metric_cols].to_numpy(dtype=np.float64, na_value=np.nan)[perm]
+    valid = ~np.isnan(values)
+
+    highlights: Dict[str, List[Dict[str, Any]]] = {}
+    for j, c in enumerate(metric_cols):
+        top3 = _top_n_desc(dates, values[:, j], valid[:, j])
+        if top3:
+            highlights[c] = top3
+
+    # Variância por métrica (ignorando ausentes) numa única chamada; só métricas com > 3 pontos
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        variances = np.nanvar(values, axis=0)[valid.sum(axis=0) > 3]
+
+    vh = "media"
+    if variances.size:
+        q1, q3 = np.percentile(variances, [25, 75])
+        vh = "alta" if (q3 - q1) > 0 else "baixa"
+    return highlights, vh
+
+def _is_number_dtype(dtype: Any) -> bool:
+    try:
+        return bool(np.issubdtype(dtype, np.number))
+    except Exception:
+        # dtype de extensão/objeto: não entra como métrica
+        return False
 
 def _dod_change_mean(df: pd.DataFrame, col: str) -> Optional[float]:
     if col not in df.columns:
         return None
-    s = df[col].fillna(0)
-    pct = s.pct_change().replace([np.inf, -np.inf], np.nan).dropna()
-    return float(pct.mean()) if not pct.empty else None
+    return _dod_change_mean_arr(df[col].fillna(0).to_numpy(dtype=np.float64))
+
+def _dod_change_mean_arr(a: np.ndarray) -> Optional[float]:
+    return _dod_change_means(a[:, None])[0]
+
+def _dod_change_means(a: np.ndarray) -> List[Optional[float]]:
+    # a: matriz (dias x métricas, ausentes = 0). Variação dia a dia de todas as métricas numa passada;
+    # x/0 (inf) e 0/0 (nan) ficam de fora como no pct_change
+    if a.shape[0] < 2:
+        return [None] * a.shape[1]
+    at = np.ascontiguousarray(a.T)  # uma linha por métrica: somas contíguas
+    with np.errstate(divide="ignore", invalid="ignore"):
+        r = np.divide(at[:, 1:], at[:, :-1])
+    r -= 1.0  # in-place: um único buffer para a razão
+    finite = np.isfinite(r)
+    # Soma só sobre os valores finitos compactados (como pct.dropna().mean()): zeros no lugar
+    # dos descartados mudariam a ordem da soma pareada do numpy e o último dígito da média
+    out: List[Optional[float]] = []
+    for row, keep in zip(r, finite):
+        vals = row[keep]
+        out.append(float(vals.sum() / vals.size) if vals.size else None)
+    return out
 
-def _weekday_breakdown(df: pd.DataFrame, col: str) -> List[Dict[str, Any]]:
-    if col not in df.columns or "data" not in df.columns:
-        return []
-    tmp = df.copy()
+@lru_cache(maxsize=1)
+def _weekday_names() -> Tuple[str, ...]:
+    # Nomes dos 7 dias (segunda=0), resolvidos uma única vez em vez de por linha
+    monday = pd.Timestamp("2024-01-01")
     try:
-        tmp["weekday"] = tmp["data"].dt.day_name(locale="pt_BR")
+        return tuple((monday + pd.Timedelta(days=k)).day_name(locale="pt_BR") for k in range(7))
     except Exception:
-        wd_map = {0: "Monday", 1: "Tuesday", 2: "Wednesday", 3: "Thursday", 4: "Friday", 5: "Saturday", 6: "Sunday"}
-        tmp["weekday"] = tmp["data"].dt.day_of_week.map(wd_map)
-    g = tmp.groupby("weekday")[col].agg(["mean", "sum", "median"]).reset_index()
-    records: List[Dict[str, Any]] = []
-    for _, row in g.iterrows():
-        records.append({
-            "weekday": str(row["weekday"]),
-            "mean": float(row["mean"]),
-            "sum": float(row["sum"]),
-            "median": float(row["median"]),
-        })
-    return records
+        return ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+
+def _weekday_breakdowns(df: pd.DataFrame, cols: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+    present = [c for c in cols if c in df.columns]
+    if not present or "data" not in df.columns:
+        return {c: [] for c in cols}
+    out = _weekday_breakdowns_arr(
+        df["data"].to_numpy(dtype="datetime64[ns]"),
+        df[present].to_numpy(dtype=np.float64, na_value=np.nan),
+        present,
+    )
+    return {c: out.get(c, []) for c in cols}
+
+def _group_sums_kahan(block_vals: np.ndarray, starts: np.ndarray, lengths: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Soma e contagem (ignorando NaN) de cada grupo contíguo, com a mesma soma compensada (Kahan)
+    e a mesma ordem de linhas do groupby sum/mean do pandas: resultados idênticos até o último dígito.
+    Percorre a r-ésima linha de todos os grupos por vez (vetorizado em grupos x colunas).
+    """
+    n_groups, n_cols = len(starts), block_vals.shape[1]
+    sumx = np.zeros((n_groups, n_cols))
+    comp = np.zeros((n_groups, n_cols))
+    nobs = np.zeros((n_groups, n_cols), dtype=np.int64)
+    for r in range(int(lengths.max()) if n_groups else 0):
+        live = np.flatnonzero(lengths > r)
+        rows = block_vals[starts[live] + r]
+        ok = ~np.isnan(rows)
+        s, c = sumx[live], comp[live]
+        y = rows - c
+        t = s + y
+        new_c = t - s - y
+        new_c[np.isnan(new_c)] = 0.0  # como no pandas: compensação NaN (inf) é zerada
+        sumx[live] = np.where(ok, t, s)
+        comp[live] = np.where(ok, new_c, c)
+        nobs[live] += ok
+    return sumx, nobs
+
+def _weekday_breakdowns_arr(dates: np.ndarray,
+                            values: np.ndarray,
+                            cols: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Quebra por dia da semana (média, soma, mediana ignorando ausentes) de todas as métricas.
+    dates: datetime64 por linha; values: matriz float64 (linhas x cols) com NaN nos ausentes.
+    Ordena as linhas pelo código do dia uma vez e reduz cada um dos (até) 7 blocos contíguos;
+    os nomes são aplicados só nos grupos resultantes.
+    """
+    valid = ~np.isnat(dates)
+    if not cols or not valid.any():
+        return {c: [] for c in cols}
+    # 1970-01-01 foi quinta-feira (dayofweek=3)
+    wd = (dates[valid].astype("datetime64[D]").astype(np.int64) + 3) % 7
+    order = np.argsort(wd, kind="stable")
+    wd_sorted = wd[order]
+    block_vals = values[valid][order]
+    codes = np.unique(wd_sorted)
+    bounds = np.searchsorted(wd_sorted, np.append(codes, 7))
+
+    n_codes, n_cols = len(codes), len(cols)
+    # Soma/média com a soma compensada do groupby (np.nansum pareada diverge no último dígito)
+    sums, counts = _group_sums_kahan(block_vals, bounds[:-1], np.diff(bounds))
+    medians = np.empty((n_codes, n_cols))
+    with np.errstate(invalid="ignore", divide="ignore"), warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)  # mediana de grupo todo ausente -> NaN
+        means = sums / counts
+        for k in range(n_codes):
+            medians[k] = np.nanmedian(block_vals[bounds[k]:bounds[k + 1]], axis=0)
+
+    names = _weekday_names()
+    labels = [names[int(k)] for k in codes]
+    # Mesma ordem de antes (agrupamento pelo nome do dia)
+    order_lbl = sorted(range(n_codes), key=labels.__getitem__)
+    return {
+        c: [
+            {"weekday": labels[i], "mean": float(means[i, j]), "sum": float(sums[i, j]), "median": float(medians[i, j])}
+            for i in order_lbl
+        ]
+        for j, c in enumerate(cols)
+    }
+
+def _weekday_breakdown(df: pd.DataFrame, col: str) -> List[Dict[str, Any]]:
+    return _weekday_breakdowns(df, [col])[col]
+
+_SUMMARY_JSON_OPTS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+def _summary_json(summary: Dict[str, Any]) -> str:
+    # orjson (C) serializa o resumo e escalares numpy direto; NaN vira null
+    try:
+        return orjson.dumps(summary, option=_SUMMARY_JSON_OPTS).decode()
+    except TypeError:
+        return json.dumps(summary, ensure_ascii=False, default=str)
 
 # =============================
 # Config/DTOs
@@ -196,6 +482,13 @@ class AnalysisPayload:
 # Classe principal
 # =============================
 
+# Estado da requisição corrente (voz, foco, tipo...). ContextVar isola tanto threads
+# do threadpool quanto tasks do event loop que compartilham a mesma instância.
+_REQUEST_STATE: ContextVar[Optional[Dict[str, Any]]] = ContextVar("analysis_request_state", default=None)
+
+class _LeaderCancelled(Exception):
+    """Sinaliza aos seguidores de uma narrativa em andamento que o líder foi cancelado."""
+
 class AdvancedDataAnalyst:
     def __init__(self,
                  vector_db: Optional[VectorDBManager] = None,
@@ -210,7 +503,22 @@ class AdvancedDataAnalyst:
             openai_api_key=self.openai_api_key or ""
         )
         self.rel_db = relational_db or RelationalDBManager()
-        self.clients_cache: Dict[str, Dict[str, Any]] = {}
+        self.clients_cache: TTLCache = TTLCache(maxsize=CLIENTS_CACHE_MAXSIZE, ttl=CLIENTS_CACHE_TTL_SECONDS)
+        # DF já normalizado por (cliente, plataforma, período): reaproveitado entre combinações de plataformas
+        self.platform_df_cache: TTLCache = TTLCache(maxsize=PLATFORM_DF_CACHE_MAX_BYTES, ttl=CLIENTS_CACHE_TTL_SECONDS,
+                                                    getsizeof=_frame_nbytes)
+        # Narrativa final por prompt completo (mesmo resumo + mesma pergunta/voz/formato => mesma resposta)
+        self.narrative_cache: TTLCache = TTLCache(maxsize=NARRATIVE_CACHE_MAXSIZE, ttl=CLIENTS_CACHE_TTL_SECONDS)
+        self.context_cache: TTLCache = TTLCache(maxsize=CONTEXT_CACHE_MAXSIZE, ttl=CONTEXT_CACHE_TTL_SECONDS)
+        # Narrativas em geração (async): requisições idênticas simultâneas aguardam a mesma chamada ao LLM
+        self._narrative_inflight: Dict[str, asyncio.Future] = {}
+        self._cache_lock = threading.Lock()
+        # Pool persistente para as cargas por plataforma (evita criar threads a cada requisição)
+        self._load_executor = ThreadPoolExecutor(max_workers=PLATFORM_LOAD_MAX_WORKERS,
+                                                 thread_name_prefix="platform-load")
+        # LLM da narrativa criado uma única vez (reaproveita o pool HTTP/TLS entre requisições)
+        self._llm = None
+        self._llm_lock = threading.Lock()
 
     # --------- Data loading ---------
     def _load_platform_df(self,
@@ -221,7 +529,14 @@ class AdvancedDataAnalyst:
                           end_date: Optional[str]) -> pd.DataFrame:
         """
         Usa RelationalDBManager.get_client_data para obter dados (coluna obrigatória 'data').
+        Resultados normalizados ficam em cache (TTL) por cliente + plataforma + período.
         """
+        cache_key = (str(client_id), platform, start_date, end_date)
+        with self._cache_lock:
+            cached = self.platform_df_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
         try:
             df = self.rel_db.get_client_data(
                 client_id=client_id,
@@ -237,96 +552,126 @@ class AdvancedDataAnalyst:
             return pd.DataFrame({"data": []})
 
         df = _normalize_platform_df(df, platform)
-        df = _prepare_dates(df)
+        # Métricas no menor tipo sem perda: metade dos bytes no cache e nas varreduras do merge/resumo
+        df = _downcast_numeric(_prepare_dates(df))
+        with self._cache_lock:
+            try:
+                self.platform_df_cache[cache_key] = df
+            except ValueError:
+                pass  # maior que o cache inteiro: devolve sem guardar
         return df
 
     def _merge_platform_dfs(self, dfs: List[pd.DataFrame]) -> pd.DataFrame:
         if not dfs:
             return pd.DataFrame({"data": []})
-        merged = dfs[0]
-        for add in dfs[1:]:
-            merged = pd.merge(merged, add, on="data", how="outer")
-        merged = merged.sort_values("data").reset_index(drop=True)
-        return merged
+        if len(dfs) == 1:
+            # _prepare_dates já entrega ordenado por 'data' com índice limpo
+            return dfs[0]
+
+        # Um único concat alinhado pelo índice 'data' no lugar de N-1 merges outer
+        indexed = [d.set_index("data") for d in dfs]
+        if all(d.index.is_unique for d in indexed):
+            merged = pd.concat(indexed, axis=1, join="outer")
+            # Entradas já vêm ordenadas de _prepare_dates: a união costuma sair ordenada e o sort é evitado
+            if not merged.index.is_monotonic_increasing:
+                merged = merged.sort_index()
+            return merged.reset_index()
+
+        # Datas repetidas numa plataforma: concat não alinha, volta ao merge outer, mas em
+        # árvore balanceada (pares vizinhos) para não re-hashear um acumulado cada vez maior
+        level = list(dfs)
+        while len(level) > 1:
+            pairs = [pd.merge(a, b, on="data", how="outer") for a, b in zip(level[::2], level[1::2])]
+            level = pairs + level[len(pairs) * 2:]
+        return level[0].sort_values("data").reset_index(drop=True)
 
     # --------- Deterministic analytics ---------
     def _compute_summary(self, merged_df: pd.DataFrame, platforms: List[str]) -> Dict[str, Any]:
         all_cols = merged_df.columns.tolist()
         metric_cols = [c for c in all_cols if c != "data"]
 
-        # Selecionar métricas canônicas por plataforma
-        candidatos: List[str] = []
-        for base in PREFERRED_BASES:
-            for p in platforms:
-                pc = f"{p}_{base}"
-                if pc in merged_df.columns:
-                    candidatos.append(pc)
+        # Selecionar métricas canônicas por plataforma (ordem: base preferida, depois plataforma)
+        present_cols = set(all_cols)
+        candidatos: List[str] = [c for c in _candidate_columns(tuple(platforms)) if c in present_cols]
 
         if not candidatos:
             candidatos = metric_cols
 
+        # merge/_prepare_dates entregam 'data' ordenada: os extremos estão nas pontas (monotônico implica sem NaT)
+        ordered = bool(merged_df["data"].is_monotonic_increasing)
+        if merged_df.empty:
+            first = last = None
+        elif ordered:
+            first, last = merged_df["data"].iloc[0], merged_df["data"].iloc[-1]
+        else:
+            first, last = merged_df["data"].min(), merged_df["data"].max()
+        period = {
+            "start": str(first.date()) if first is not None else None,
+            "end": str(last.date()) if last is not None else None,
+        }
+
+        # Sem linhas (nada no intervalo) ou sem métricas: esqueleto vazio, sem despachar os helpers
+        if merged_df.empty or not candidatos:
+            summary = {
+                "period": period, "kpis": {}, "anomalies": {}, "trends": {}, "segments": {},
+                "meta": {"platforms": platforms, "columns": all_cols, "selected_metrics": [],
+                         "variance_hint": "media"},
+                "highlights": {},
+            }
+            if period["start"] and period["end"]:
+                summary["period_compare"] = {}
+            return summary
+
+        # Cada métrica convertida para float uma única vez: com NaN (anomalias) e com 0 (KPIs/tendência)
+        raw = merged_df[candidatos].to_numpy(dtype=np.float64, na_value=np.nan)
+        nan_mask = np.isnan(raw)
+        filled = np.where(nan_mask, 0.0, raw)
+        dates = merged_df["data"].to_numpy(dtype="datetime64[ns]")
+
         summary: Dict[str, Any] = {
-            "period": {
-                "start": str(merged_df["data"].min().date()) if not merged_df.empty else None,
-                "end": str(merged_df["data"].max().date()) if not merged_df.empty else None,
-            },
-            "kpis": _basic_kpis(merged_df, candidatos),
-            "anomalies": {c: _mad_anomalies(merged_df, c) for c in candidatos},
-            "trends": {f"{c}_dod_mean": _dod_change_mean(merged_df, c) for c in candidatos},
-            "segments": {f"{c}_by_weekday": _weekday_breakdown(merged_df, c) for c in candidatos},
+            "period": period,
+            "kpis": _basic_kpis_arr(filled, candidatos),
+            "anomalies": _mad_anomalies_mat(dates, raw, candidatos),
+            "trends": {f"{c}_dod_mean": m for c, m in zip(candidatos, _dod_change_means(filled))},
+            "segments": {f"{c}_by_weekday": wd for c, wd in _weekday_breakdowns_arr(dates, raw, candidatos).items()},
             "meta": {"platforms": platforms, "columns": all_cols, "selected_metrics": candidatos},
         }
 
-        # ---- Highlights: top 3 por métrica ----
-        highlights = {}
-        for c in candidatos:
-            dfc = merged_df[["data", c]].dropna()
-            if dfc.empty: 
-                continue
-            top3 = dfc.sort_values(c, ascending=False).head(3)
-            highlights[c] = [
-                {"date": str(r["data"].date()), "value": float(r[c])}
-                for _, r in top3.iterrows()
-            ]
-        summary["highlights"] = highlights
+        # ---- Highlights (todas as métricas numéricas) + variance_hint ----
+        summary["highlights"], variance_hint = _highlights_and_variance_hint(merged_df)
 
         # ---- Comparação com período anterior (mesma duração) ----
         try:
-            import pandas as pd
-            period = summary["period"]
-            if period["start"] and period["end"]:
-                start = pd.to_datetime(period["start"])
-                end   = pd.to_datetime(period["end"])
-                delta = (end - start) or pd.Timedelta(days=1)
-                prev_start, prev_end = start - delta, start
-                prev_mask = (merged_df["data"] >= prev_start) & (merged_df["data"] < prev_end)
-                cur_mask  = (merged_df["data"] >= start)      & (merged_df["data"] <= end)
+            if len(merged_df) < 2:
+                # Um único dia: a janela anterior é sempre vazia, nada a comparar
+                summary["period_compare"] = {}
+            elif period["start"] and period["end"]:
+                start = pd.Timestamp(period["start"]).to_datetime64()
+                end = pd.Timestamp(period["end"]).to_datetime64()
+                delta = (end - start) or np.timedelta64(1, "D")
+                prev_start = start - delta
+                # 'data' ordenada: as janelas viram fatias contíguas (searchsorted)
+                if ordered:
+                    i_prev, i_start = np.searchsorted(dates, [prev_start, start])
+                    i_end = np.searchsorted(dates, end, side="right")
+                    cur_rows, prev_rows = slice(i_start, i_end), slice(i_prev, i_start)
+                else:
+                    cur_rows = (dates >= start) & (dates <= end)
+                    prev_rows = (dates >= prev_start) & (dates < start)
+                with warnings.catch_warnings():
+                    warnings.simplefilter("ignore", RuntimeWarning)  # janela vazia -> NaN
+                    cur_means = np.nanmean(raw[cur_rows], axis=0)
+                    prev_means = np.nanmean(raw[prev_rows], axis=0)
                 comp = {}
-                for c in candidatos:
-                    cur  = merged_df.loc[cur_mask, c].mean()
-                    prev = merged_df.loc[prev_mask, c].mean()
-                    if pd.notna(cur) and pd.notna(prev) and prev != 0:
+                for i, c in enumerate(candidatos):
+                    cur, prev = cur_means[i], prev_means[i]
+                    if not np.isnan(cur) and not np.isnan(prev) and prev != 0:
                         comp[c] = {"cur": float(cur), "prev": float(prev), "delta_pct": float((cur/prev) - 1)}
                 summary["period_compare"] = comp
         except Exception:
             pass
 
-        # ---- Variância “baixa|media|alta” para gating de few-shots ----
-        try:
-            import numpy as np
-            variances = []
-            for c in candidatos:
-                s = merged_df[c].dropna()
-                if len(s) > 3:
-                    variances.append(float(np.var(s)))
-            vh = "baixa"
-            if variances:
-                q3 = np.quantile(variances, 0.75)
-                q1 = np.quantile(variances, 0.25)
-                vh = "alta" if q3 > 0 and (q3 - q1) > 0 else "media"
-            summary["meta"]["variance_hint"] = vh
-        except Exception:
-            summary["meta"]["variance_hint"] = "media"
+        summary["meta"]["variance_hint"] = variance_hint
 
         return summary
 
@@ -336,14 +681,15 @@ class AdvancedDataAnalyst:
         - highlights: top 3 valores por métrica com a data
         - meta.variance_hint: 'baixa' | 'media' | 'alta' (gating de few-shots)
         Não mexe no _compute_summary. É chamado depois.
+        O _compute_summary já entrega ambos com a mesma regra: nesse caso nada a refazer.
         """
-        import numpy as np
-        import pandas as pd
+        if "highlights" in summary and "variance_hint" in summary.get("meta", {}):
+            return summary
 
         if "data" in merged_df.columns:
             merged_df = merged_df.copy()
             merged_df["data"] = pd.to_datetime(merged_df["data"], errors="coerce")
-            merged_df = merged_df.dropna(subset=["data"]).sort_values("data")
+            merged_df = merged_df.dropna(subset=["data"]).sort_values("data", kind="stable")
 
         # Escolhe métricas numéricas (todas colunas exceto 'data')
         metric_cols = []
@@ -363,7 +709,7 @@ class AdvancedDataAnalyst:
             dfc = merged_df[["data", c]].dropna()
             if dfc.empty:
                 continue
-            top3 = dfc.sort_values(c, ascending=False).head(3)
+            top3 = dfc.sort_values(c, ascending=False, kind="stable").head(3)
             highlights[c] = [
                 {"date": d.strftime("%Y-%m-%d"), "value": float(v)}
                 for d, v in zip(top3["data"], top3[c])
@@ -388,85 +734,198 @@ class AdvancedDataAnalyst:
         return summary
 
     # --------- Narrative (LLM) ---------
-    def _make_narrative(self,
-                        platforms: List[str],
-                        analysis_type: str,
-                        analysis_query: str,
-                        context_text: str,
-                        summary: Dict[str, Any],
-                        output_format: str = "detalhado",
-                        bilingual: bool = True) -> str:
+    def _req(self, name: str, default: Any) -> Any:
+        state = _REQUEST_STATE.get()
+        return state.get(name, default) if state else default
+
+    def _narrative_messages(self,
+                            platforms: List[str],
+                            analysis_type: str,
+                            analysis_query: str,
+                            context_text: str,
+                            summary: Dict[str, Any],
+                            output_format: str = "detalhado",
+                            bilingual: bool = True,
+                            summary_text: Optional[str] = None) -> List[Dict[str, str]]:
         """
         Monta as mensagens para o LLM com:
         - system: identidade + voz + foco (build_chat_system_prompt)
         - user: instruções completas + [DADOS] + [CONTEXTO] (build_narrative_prompt)
         """
         system_content = build_chat_system_prompt(
-            client_name=getattr(self, "client_name", "Cliente"),
-            voice_profile=getattr(self, "voice_profile", "CMO"),
-            analysis_focus=getattr(self, "analysis_focus", "panorama"),
+            client_name=self._req("client_name", "Cliente"),
+            voice_profile=self._req("voice_profile", "CMO"),
+            analysis_focus=self._req("analysis_focus", "panorama"),
         )
         user_content = build_narrative_prompt(
             platforms=platforms,
             analysis_type=analysis_type,
-            analysis_focus=getattr(self, "analysis_focus", "panorama"),
+            analysis_focus=self._req("analysis_focus", "panorama"),
             analysis_query=analysis_query,
             context_text=context_text,
             summary_json=summary,
             output_format=output_format,
-            granularity=getattr(self, "current_granularity", "detalhada"),
+            granularity=self._req("current_granularity", "detalhada"),
             bilingual=bilingual,
-            voice_profile=getattr(self, "voice_profile", "CMO"),
-            decision_mode=getattr(self, "decision_mode", "decision_brief"),
-            narrative_style=getattr(self, "narrative_style", "SCQA"),
-        )
-        if ChatOpenAI is None:
-            return (
-                "[Aviso: ChatOpenAI indisponível no ambiente]\n\n"
-                "Resumo JSON:\n" + str(summary) + "\n\n"
-                "Solicitação:\n" + analysis_query + "\n\n"
-                "(Nesta etapa, um LLM redigiria a narrativa com base no JSON e contexto acima.)"
-            )
-
-        # Config mais adequada para narrativa: criatividade moderada, pouca repetição
-        llm = ChatOpenAI(
-            model="gpt-4.1",
-            temperature=0.7,
-            presence_penalty=0.1,
-            frequency_penalty=0.1,
-            api_key=self.openai_api_key,
+            voice_profile=self._req("voice_profile", "CMO"),
+            decision_mode=self._req("decision_mode", "decision_brief"),
+            narrative_style=self._req("narrative_style", "SCQA"),
+            summary_text=summary_text,
         )
-
-        msgs = [
+        return [
             {"role": "system", "content": system_content},
             {"role": "user", "content": user_content},
         ]
+
+    @staticmethod
+    def _narrative_unavailable(summary: Dict[str, Any], analysis_query: str) -> str:
+        return (
+            "[Aviso: ChatOpenAI indisponível no ambiente]\n\n"
+            "Resumo JSON:\n" + _summary_json(summary) + "\n\n"
+            "Solicitação:\n" + analysis_query + "\n\n"
+            "(Nesta etapa, um LLM redigiria a narrativa com base no JSON e contexto acima.)"
+        )
+
+    def _make_narrative(self,
+                        platforms: List[str],
+                        analysis_type: str,
+                        analysis_query: str,
+                        context_text: str,
+                        summary: Dict[str, Any],
+                        output_format: str = "detalhado",
+                        bilingual: bool = True,
+                        summary_text: Optional[str] = None) -> str:
+        if ChatOpenAI is None:
+            return self._narrative_unavailable(summary, analysis_query)
+
+        msgs = self._narrative_messages(platforms, analysis_type, analysis_query,
+                                        context_text, summary, output_format, bilingual, summary_text)
+        cache_key = self._narrative_key(msgs, output_format)
+        with self._cache_lock:
+            cached = self.narrative_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        llm = self._get_llm()
         first = llm.invoke(msgs).content  # type: ignore
 
-        refined = self._refine_if_generic(llm, first, summary, user_content)
-        return self._postprocess_output(refined, output_format)
+        refined = self._refine_if_generic(llm, first, summary, msgs[1]["content"])
+        out = self._postprocess_output(refined, output_format)
+        with self._cache_lock:
+            self.narrative_cache[cache_key] = out
+        return out
+
+    async def _amake_narrative(self,
+                               platforms: List[str],
+                               analysis_type: str,
+                               analysis_query: str,
+                               context_text: str,
+                               summary: Dict[str, Any],
+                               output_format: str = "detalhado",
+                               bilingual: bool = True,
+                               summary_text: Optional[str] = None) -> str:
+        """Versão assíncrona de _make_narrative (llm.ainvoke não bloqueia o event loop)."""
+        if ChatOpenAI is None:
+            return self._narrative_unavailable(summary, analysis_query)
+
+        msgs = self._narrative_messages(platforms, analysis_type, analysis_query,
+                                        context_text, summary, output_format, bilingual, summary_text)
+        cache_key = self._narrative_key(msgs, output_format)
+
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._cache_lock:
+                cached = self.narrative_cache.get(cache_key)
+                if cached is not None:
+                    return cached
+                pending = self._narrative_inflight.get(cache_key)
+                if pending is None or pending.get_loop() is not loop:
+                    pending = None
+                    fut = loop.create_future()
+                    self._narrative_inflight[cache_key] = fut
+            if pending is None:
+                break
+            try:
+                return await asyncio.shield(pending)
+            except _LeaderCancelled:
+                # O líder foi cancelado: a entrada já saiu de _narrative_inflight, tenta de novo (como líder)
+                continue
 
-    def _refine_if_generic(self, llm, text: str, summary: Dict[str, Any], user_content: str) -> str:
-        import re, json
+        try:
+            llm = self._get_llm()
+            first = (await llm.ainvoke(msgs)).content  # type: ignore
+
+            refine_msgs = self._refine_messages(first, summary)
+            refined = first
+            if refine_msgs is not None:
+                refined = (await llm.ainvoke(refine_msgs)).content or first
+            out = self._postprocess_output(refined, output_format)
+            with self._cache_lock:
+                self.narrative_cache[cache_key] = out
+        except asyncio.CancelledError:
+            # Não cancela o futuro compartilhado: quem aguardava recomeça em vez de herdar o cancelamento
+            fut.set_exception(_LeaderCancelled())
+            fut.exception()
+            raise
+        except Exception as e:
+            fut.set_exception(e)
+            fut.exception()  # marca como lida: sem aviso quando ninguém mais aguardava
+            raise
+        finally:
+            with self._cache_lock:
+                if self._narrative_inflight.get(cache_key) is fut:
+                    del self._narrative_inflight[cache_key]
+        fut.set_result(out)
+        return out
+
+    @staticmethod
+    def _narrative_key(msgs: List[Dict[str, str]], output_format: str) -> str:
+        h = hashlib.blake2b(digest_size=16)
+        for m in msgs:
+            h.update(m["content"].encode("utf-8"))
+            h.update(b"\x00")
+        h.update((output_format or "").encode("utf-8"))
+        return h.hexdigest()
+
+    def _get_llm(self):
+        if self._llm is None:
+            with self._llm_lock:
+                if self._llm is None:
+                    # Config mais adequada para narrativa: criatividade moderada, pouca repetição
+                    self._llm = ChatOpenAI(
+                        model="gpt-4.1",
+                        temperature=0.7,
+                        presence_penalty=0.1,
+                        frequency_penalty=0.1,
+                        api_key=self.openai_api_key,
+                    )
+        return self._llm
+
+    def _refine_messages(self, text: str, summary: Dict[str, Any]) -> Optional[List[Dict[str, str]]]:
+        # Sem destaques no resumo não há datas/números concretos para citar: revisão seria inútil
+        if not (summary or {}).get("highlights"):
+            return None
         # heurísticas simples:
         # - se não tiver NENHUM número ou data, pedir revisão focando em datas/números do JSON
-        has_number = bool(re.search(r"\d{2}/\d{2}|\d{4}-\d{2}-\d{2}|\b\d{2,}[.,]?\d*\b", text))
-        has_date   = bool(re.search(r"\b\d{1,2}/\d{1,2}\b|\b\d{4}-\d{2}-\d{2}\b", text))
-        if has_number and has_date:
-            return text
+        if _HAS_NUMBER_RE.search(text) and _HAS_DATE_RE.search(text):
+            return None
 
         refine_prompt = (
             "Revise o texto abaixo: ele está genérico. Reescreva citando datas e números concretos do JSON a seguir, "
             "sempre que isso ajudar a explicar o movimento dos dados.\n\n"
             "[TEXTO]\n" + text + "\n\n"
-            "[DADOS]\n" + json.dumps(summary, ensure_ascii=False)
+            "[DADOS]\n" + _summary_json(summary)
         )
-        out = llm.invoke(
-            [
-                {"role": "system", "content": "Você é um editor sênior objetivo e técnico."},
-                {"role": "user", "content": refine_prompt},
-            ]
-        ).content
+        return [
+            {"role": "system", "content": "Você é um editor sênior objetivo e técnico."},
+            {"role": "user", "content": refine_prompt},
+        ]
+
+    def _refine_if_generic(self, llm, text: str, summary: Dict[str, Any], user_content: str) -> str:
+        refine_msgs = self._refine_messages(text, summary)
+        if refine_msgs is None:
+            return text
+        out = llm.invoke(refine_msgs).content
         return out or text
 
     def _postprocess_output(self, text: str, output_format: str) -> str:
@@ -475,8 +934,6 @@ class AdvancedDataAnalyst:
         - "topicos": garante lista em bullets se o modelo não fizer.
         - "resumido": corta para poucas frases se vier longo demais.
         """
-        import re
-
         fmt = (output_format or "detalhado").strip().lower()
         cleaned = text.strip()
 
@@ -487,17 +944,14 @@ class AdvancedDataAnalyst:
             if has_bullets:
                 return cleaned
 
-            # Caso contrário, transforma frases em bullets
-            sentences = re.split(r'(?<=[.!?])\s+', cleaned)
+            # Caso contrário, transforma frases em bullets (no máximo 10: não precisa quebrar o resto)
+            sentences = _SENTENCE_SPLIT_RE.split(cleaned, maxsplit=10)[:10]
             bullets = [f"- {s.strip()}" for s in sentences if s.strip()]
-            # Evita criar lista gigantesca
-            if len(bullets) > 10:
-                bullets = bullets[:10]
             return "\n".join(bullets)
 
         if fmt == "resumido":
             # Mantém só as primeiras 4–5 frases para forçar concisão
-            sentences = re.split(r'(?<=[.!?])\s+', cleaned)
+            sentences = _SENTENCE_SPLIT_RE.split(cleaned, maxsplit=5)
             if len(sentences) > 5:
                 cleaned = " ".join(sentences[:5]).strip()
             return cleaned
@@ -546,76 +1000,158 @@ class AdvancedDataAnalyst:
 
         return " | ".join(parts)
 
-    def get_client_agent(self,
-                         agency_id: str,
-                         client_id: str,
-                         platforms: List[str],
-                         start_date: Optional[str],
-                         end_date: Optional[str]) -> Callable[[str, str, bool], Dict[str, Any]]:
-        # 1) Carregar e normalizar DFs por plataforma
-        dfs: List[pd.DataFrame] = []
-        for p in platforms:
-            dfp = self._load_platform_df(agency_id, client_id, p, start_date, end_date)
-            if not dfp.empty:
-                dfs.append(dfp)
+    def _get_summary(self,
+                     agency_id: str,
+                     client_id: str,
+                     platforms: List[str],
+                     start_date: Optional[str],
+                     end_date: Optional[str]) -> Tuple[Dict[str, Any], str]:
+        """
+        Resumo determinístico + sua forma serializada para o prompt (ambos em cache).
+        Pode refletir o banco de até CLIENTS_CACHE_TTL_SECONDS atrás.
+        """
+        # 1) Cache por agência + cliente + plataformas + período solicitado. Plataformas em ordem
+        #    canônica (os chamadores já ordenam): [a, b] e [b, a] compartilham a entrada e o resumo
+        platforms = sorted(platforms)
+        cache_key = (str(agency_id), str(client_id), tuple(platforms), start_date, end_date)
+        with self._cache_lock:
+            cached = self.clients_cache.get(cache_key)
+        if cached is not None:
+            return cached["summary"], cached["summary_text"]
+
+        # 2) Carregar e normalizar DFs por plataforma (consultas independentes em paralelo,
+        #    preservando a ordem das plataformas)
+        def _load(p: str) -> pd.DataFrame:
+            return self._load_platform_df(agency_id, client_id, p, start_date, end_date)
+
+        if len(platforms) > 1:
+            loaded = list(self._load_executor.map(_load, platforms))
+        else:
+            loaded = [_load(p) for p in platforms]
+        dfs: List[pd.DataFrame] = [dfp for dfp in loaded if not dfp.empty]
         merged_df = self._merge_platform_dfs(dfs)
 
-        # 2) Computar resumo determinístico
+        # 3) Computar resumo determinístico (DFs do cache podem vir em float32)
+        merged_df = _upcast_float32(merged_df)
         summary = self._compute_summary(merged_df, platforms)
         summary = self._enrich_summary(merged_df, platforms, summary)
 
-        # 3) Cache por cliente + plataformas + período
-        key_platforms = "_".join(sorted(platforms))
-        cache_key = f"{client_id}_{key_platforms}_{summary['period']['start']}_{summary['period']['end']}"
+        # Serializado uma vez; reaproveitado em todas as narrativas do mesmo recorte
+        summary_text = str(summary)
 
-        self.clients_cache[cache_key] = {
-            "df": merged_df,
-            "summary": summary,
-            "ts": datetime.now().isoformat(),
-        }
+        # Só o resumo fica em cache: nada lê o DF mesclado depois, e os DFs por plataforma
+        # já estão em platform_df_cache para recombinações
+        with self._cache_lock:
+            self.clients_cache[cache_key] = {
+                "summary": summary,
+                "summary_text": summary_text,
+                "ts": datetime.now().isoformat(),
+            }
+        return summary, summary_text
 
-        # 4) Retornar função de invocação que busca contexto + narra
-        def _invoke(analysis_query: str, output_format: str = "detalhado", bilingual: bool = True) -> Dict[str, Any]:
-            # Tipo/foco corrente vindos do run_analysis
-            atype = self.current_analysis_type if hasattr(self, "current_analysis_type") else "descriptive"
-            focus = getattr(self, "analysis_focus", "panorama")
+    def _retrieve_context(self,
+                          agency_id: str,
+                          client_id: str,
+                          platforms: List[str],
+                          summary: Dict[str, Any],
+                          analysis_query: str) -> str:
+        # Montar query enriquecida para o RAG (tipo/foco correntes vindos do run_analysis)
+        rag_query = self._build_rag_query(
+            analysis_query=analysis_query or "panorama do período",
+            platforms=platforms,
+            summary=summary,
+            analysis_type=self._req("current_analysis_type", "descriptive"),
+            analysis_focus=self._req("analysis_focus", "panorama"),
+        )
 
-            # 4.1) Montar query enriquecida para o RAG
-            rag_query = self._build_rag_query(
-                analysis_query=analysis_query or "panorama do período",
-                platforms=platforms,
-                summary=summary,
-                analysis_type=atype,
-                analysis_focus=focus,
-            )
+        # Buscar contexto histórico no Pinecone (read-aside: mesma query do mesmo cliente não repete a busca)
+        cache_key = (str(agency_id), str(client_id),
+                     hashlib.blake2b(rag_query.encode("utf-8"), digest_size=12).hexdigest())
+        with self._cache_lock:
+            cached = self.context_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        context_text = self.vector_db.retrieve_context_for_analysis(
+            query=rag_query,
+            scope="client",
+            agency_id=agency_id,
+            client_id=client_id,
+            k_total=8,
+        )
+        with self._cache_lock:
+            self.context_cache[cache_key] = context_text
+        return context_text
+
+    def invalidate_context_cache(self,
+                                 scope: Optional[str] = None,
+                                 agency_id: Optional[str] = None,
+                                 client_id: Optional[str] = None) -> None:
+        """
+        Descarta contextos RAG em cache (chamado após inclusão/exclusão de documentos).
+        O retrieval só lê o namespace do cliente: mudança com scope 'client' descarta apenas
+        as entradas daquele (agência, cliente); nos demais casos limpa tudo.
+        Vale só para este processo: os outros workers do gunicorn seguem com o contexto antigo
+        até o TTL (CONTEXT_CACHE_TTL_SECONDS) expirar.
+        """
+        with self._cache_lock:
+            if scope == "client" and agency_id is not None and client_id is not None:
+                prefix = (str(agency_id), str(client_id))
+                for key in [k for k in self.context_cache.keys() if k[:2] == prefix]:
+                    self.context_cache.pop(key, None)
+            else:
+                self.context_cache.clear()
 
-            # 4.2) Buscar contexto histórico no Pinecone
-            context_text = self.vector_db.retrieve_context_for_analysis(
-                query=rag_query,
-                scope="client",
-                agency_id=agency_id,
-                client_id=client_id,
-                k_total=8,
-            )
+    def get_client_agent(self,
+                         agency_id: str,
+                         client_id: str,
+                         platforms: List[str],
+                         start_date: Optional[str],
+                         end_date: Optional[str]) -> Callable[[str, str, bool], Dict[str, Any]]:
+        # Mesma ordem canônica do resumo em cache também no RAG e na narrativa
+        platforms = sorted(platforms)
+        summary, summary_text = self._get_summary(agency_id, client_id, platforms, start_date, end_date)
 
-            # 4.3) Gerar narrativa (LLM apenas redige)
+        # 4) Retornar função de invocação que busca contexto + narra
+        def _invoke(analysis_query: str, output_format: str = "detalhado", bilingual: bool = True) -> Dict[str, Any]:
+            context_text = self._retrieve_context(agency_id, client_id, platforms, summary, analysis_query)
+
+            # Gerar narrativa (LLM apenas redige)
             analysis_text = self._make_narrative(
                 platforms=platforms,
-                analysis_type=atype,
+                analysis_type=self._req("current_analysis_type", "descriptive"),
                 analysis_query=analysis_query,
                 context_text=context_text,
                 summary=summary,
                 output_format=output_format,
                 bilingual=bilingual,
+                summary_text=summary_text,
             )
             return {"summary": summary, "analysis": analysis_text}
 
         return _invoke
 
-    def run_analysis(self, payload: Dict[str, Any]) -> Dict[str, Any]:
-        start_time = datetime.now()
+    async def _ainvoke(self, ap: AnalysisPayload, summary: Dict[str, Any], summary_text: str) -> Dict[str, Any]:
+        # Pinecone é síncrono: roda em thread (o ContextVar da requisição é copiado junto)
+        context_text = await asyncio.to_thread(
+            self._retrieve_context, ap.agency_id, ap.client_id, ap.platforms, summary, ap.analysis_query
+        )
+        analysis_text = await self._amake_narrative(
+            platforms=ap.platforms,
+            analysis_type=ap.analysis_type,
+            analysis_query=ap.analysis_query,
+            context_text=context_text,
+            summary=summary,
+            output_format=ap.output_format,
+            bilingual=ap.bilingual,
+            summary_text=summary_text,
+        )
+        return {"summary": summary, "analysis": analysis_text}
+
+    def _prepare_request(self, payload: Dict[str, Any]) -> AnalysisPayload:
         raw_platforms = payload.get("platforms") or []
-        platforms_list = [str(p) for p in raw_platforms]
+        # Ordem canônica em toda a análise (resumo em cache, RAG, prompt e resposta): [a, b] == [b, a]
+        platforms_list = sorted(str(p) for p in raw_platforms)
 
         # >>> regra: se não vier tipo de análise e foco for NEGÓCIO,
         # >>> usar "general" (análise integrada: descritiva + preditiva + prescritiva)
@@ -651,14 +1187,62 @@ class AdvancedDataAnalyst:
         else:
             ap.decision_mode = "narrativa"
 
+        # Guardar o estado da requisição para narrativa/RAG usarem
+        _REQUEST_STATE.set({
+            "voice_profile": ap.voice_profile,
+            "decision_mode": ap.decision_mode,
+            "narrative_style": ap.narrative_style,
+            "current_analysis_type": ap.analysis_type,
+            "current_granularity": ap.granularity,
+            "analysis_focus": ap.analysis_focus,
+        })
+        return ap
+
+    def _fill_default_query(self, ap: AnalysisPayload) -> None:
+        # Se não vier pergunta específica, monta uma a partir dos templates
+        if ap.analysis_query:
+            return
+        if ap.analysis_focus == "negocio":
+            ap.analysis_query = (
+                "Quero uma análise de negócio completa para este cliente, "
+                "combinando visão descritiva, preditiva e prescritiva em um único texto. "
+                "Foque em receita, margens, eficiência, riscos e oportunidades do negócio, dentre outros o que achar significativo falar e sem economizar texto, raciocínio ou análise, "
+                "usando o máximo possível de números e valores disponíveis nos dados, "
+                "sem se prender a plataformas específicas."
+            )
+        else:
+            date_filter = ""
+            if ap.start_date and ap.end_date:
+                date_filter = f" no período de {ap.start_date} a {ap.end_date}"
+            elif ap.start_date:
+                date_filter = f" a partir de {ap.start_date}"
+            elif ap.end_date:
+                date_filter = f" até {ap.end_date}"
+            ap.analysis_query = get_analysis_prompt(ap.analysis_type, ap.platforms, date_filter)
+
+    @staticmethod
+    def _build_response(ap: AnalysisPayload,
+                        result: Dict[str, Any],
+                        status: str,
+                        error: Optional[str],
+                        start_time: float) -> Dict[str, Any]:
+        return {
+            "agency_id": ap.agency_id,
+            "client_id": ap.client_id,
+            "platforms": ap.platforms,
+            "analysis_type": ap.analysis_type,
+            "query": ap.analysis_query,
+            "summary": result.get("summary"),
+            "result": result.get("analysis"),
+            "execution_time": time.perf_counter() - start_time,
+            "timestamp": datetime.now().isoformat(),
+            "status": status,
+            "error": error,
+        }
 
-        # Guardar o tipo de análise corrente para o _invoke usar
-        self.voice_profile = ap.voice_profile
-        self.decision_mode = ap.decision_mode
-        self.narrative_style = ap.narrative_style
-        self.current_analysis_type = ap.analysis_type
-        self.current_granularity = ap.granularity
-        self.analysis_focus = ap.analysis_focus
+    def run_analysis(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        start_time = time.perf_counter()
+        ap = self._prepare_request(payload)
 
         invoke_func = self.get_client_agent(
             agency_id=ap.agency_id,
@@ -668,25 +1252,7 @@ class AdvancedDataAnalyst:
             end_date=ap.end_date,
         )
 
-        # Se não vier pergunta específica, monta uma a partir dos templates
-        if not ap.analysis_query:
-            if ap.analysis_focus == "negocio":
-                ap.analysis_query = (
-                    "Quero uma análise de negócio completa para este cliente, "
-                    "combinando visão descritiva, preditiva e prescritiva em um único texto. "
-                    "Foque em receita, margens, eficiência, riscos e oportunidades do negócio, dentre outros o que achar significativo falar e sem economizar texto, raciocínio ou análise, "
-                    "usando o máximo possível de números e valores disponíveis nos dados, "
-                    "sem se prender a plataformas específicas."
-                )
-            else:
-                date_filter = ""
-                if ap.start_date and ap.end_date:
-                    date_filter = f" no período de {ap.start_date} a {ap.end_date}"
-                elif ap.start_date:
-                    date_filter = f" a partir de {ap.start_date}"
-                elif ap.end_date:
-                    date_filter = f" até {ap.end_date}"
-                ap.analysis_query = get_analysis_prompt(ap.analysis_type, ap.platforms, date_filter)
+        self._fill_default_query(ap)
         try:
             result = invoke_func(ap.analysis_query, ap.output_format, ap.bilingual)
             status = "success"
@@ -696,18 +1262,32 @@ class AdvancedDataAnalyst:
             status = "error"
             error = str(e)
 
-        end_time = datetime.now()
-        response_json_return = {
-            "agency_id": ap.agency_id,
-            "client_id": ap.client_id,
-            "platforms": ap.platforms,
-            "analysis_type": ap.analysis_type,
-            "query": ap.analysis_query,
-            "summary": result.get("summary"),
-            "result": result.get("analysis"),
-            "execution_time": (end_time - start_time).total_seconds(),
-            "timestamp": datetime.now().isoformat(),
-            "status": status,
-            "error": error,
-        }
-        return response_json_return
+        return self._build_response(ap, result, status, error, start_time)
+
+    async def arun_analysis(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Mesmo contrato de run_analysis, sem bloquear o event loop:
+        carga/resumo e Pinecone rodam em threads; o LLM usa ainvoke.
+        """
+        start_time = time.perf_counter()
+        ap = self._prepare_request(payload)
+
+        summary, summary_text = await asyncio.to_thread(
+            self._get_summary, ap.agency_id, ap.client_id, ap.platforms, ap.start_date, ap.end_date
+        )
+
+        self._fill_default_query(ap)
+        try:
+            result = await self._ainvoke(ap, summary, summary_text)
+            status = "success"
+            error = None
+        except Exception as e:  # pragma: no cover
+            result = {"summary": None, "analysis": f"Falha na análise: {str(e)}"}
+            status = "error"
+            error = str(e)
+
+        return self._build_response(ap, result, status, error, start_time)
+
+    async def arun_many(self, payloads: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        # Cada task recebe sua cópia do contexto, então o estado de uma análise não vaza para outra
+        return list(await asyncio.gather(*(self.arun_analysis(p) for p in payloads)))
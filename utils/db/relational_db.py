@@ -1,10 +1,13 @@
 # utils/db/relational_db.py
+import logging
 import pandas as pd
 from sqlalchemy import create_engine, text
 from typing import Dict, Optional, Any
 import base64
 import pickle
 
+logger = logging.getLogger(__name__)
+
 class RelationalDBManager:
     def __init__(self, connection_string=None):
         # Inicializar conexão com o banco de dados
@@ -12,7 +15,7 @@ class RelationalDBManager:
         try:
             self.db_engine = create_engine(self.connection_string)
         except Exception as e:
-            print(f"Erro ao conectar ao RDS: {e}")
+            logger.error("Erro ao conectar ao RDS: %s", e)
             raise e
             
         # Mapeamentos de colunas de plataforma
@@ -96,7 +99,7 @@ class RelationalDBManager:
                     
             return None
         except Exception as e:
-            print(f"Error retrieving agent from database: {str(e)}")
+            logger.error("Error retrieving agent from database: %s", e)
             return None
     
     def store_client_agent(self, client_id: str, platform: str, agent_data: Dict) -> bool:
@@ -171,7 +174,7 @@ class RelationalDBManager:
                             })
                         except Exception as e:
                             # Se falhar, pode ser porque há colunas obrigatórias faltando
-                            print(f"Erro ao inserir no banco: {e}")
+                            logger.warning("Erro ao inserir no banco: %s", e)
                             # Tente com todos os campos necessários
                             full_insert_query = """
                             INSERT INTO customer (id_customer, agent_data, created_at, updated_at, email, name, id_user) 
@@ -185,5 +188,5 @@ class RelationalDBManager:
                         
             return True
         except Exception as e:
-            print(f"Error storing agent in database: {str(e)}")
+            logger.error("Error storing agent in database: %s", e)
             return False
\ No newline at end of file
@@ -1,20 +1,131 @@
 # ===== Arquivo: utils/db/vector_db.py =====
-
-from typing import List, Optional, Dict, Any, Literal
-from langchain.schema import Document
-from langchain_openai import OpenAIEmbeddings
-from langchain_pinecone import PineconeVectorStore
-from pinecone import Pinecone, ServerlessSpec
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Iterator, List, Optional, Dict, Any, Literal, Sequence, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import hashlib
+import tempfile
+import threading
+from cachetools import TTLCache
 import pandas as pd
-from datetime import datetime
+from pandas.api.types import is_datetime64_any_dtype
+from datetime import datetime, timezone
+from functools import lru_cache
+
+# langchain/pinecone são importados sob demanda (primeiro uso do banco vetorial), fora do cold start
+if TYPE_CHECKING:
+    from langchain.embeddings import CacheBackedEmbeddings
+    from langchain.schema import Document
+    from langchain_openai import OpenAIEmbeddings
+    from langchain_pinecone import PineconeVectorStore
+    from pinecone import Pinecone
+
+# Embeddings de consultas dependem só do texto: cache longo e compartilhado por instância
+EMBEDDING_CACHE_MAXSIZE = 10_000
+EMBEDDING_CACHE_TTL_SECONDS = 3600
+# Embeddings de documentos por conteúdo (re-uploads do mesmo texto não voltam à OpenAI)
+DOCUMENT_EMBEDDING_CACHE_MAXSIZE = 1024
+DOCUMENT_EMBEDDING_CACHE_TTL_SECONDS = 24 * 3600
+VECTOR_SEARCH_MAX_WORKERS = 8
+
+# Clientes compartilhados no processo por chave de API: instâncias extras reaproveitam pool HTTP e tokenizer
+_PINECONE_CLIENTS: Dict[str, Pinecone] = {}
+_EMBEDDING_CLIENTS: Dict[str, OpenAIEmbeddings] = {}
+_CLIENTS_LOCK = threading.Lock()
+
+def _utc_now_iso() -> str:
+    # Mesmo formato de antes (utcnow().isoformat() + "Z"), sem o utcnow depreciado
+    return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+
+class _EmbeddingStore:
+    """
+    Store limitado (TTLCache) para o CacheBackedEmbeddings, com a interface de BaseStore
+    (mget/mset/mdelete/yield_keys) sem importar langchain no cold start.
+    Chave = hash do modelo + texto, para não manter documentos inteiros em memória.
+    """
+
+    def __init__(self, model: str, maxsize: int, ttl: float):
+        self._model = model
+        self._cache: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+
+    def _key(self, text: str) -> str:
+        return hashlib.blake2b(f"{self._model}\x00{text}".encode("utf-8"), digest_size=16).hexdigest()
+
+    def mget(self, keys: Sequence[str]) -> List[Optional[List[float]]]:
+        hashed = [self._key(k) for k in keys]
+        with self._lock:
+            return [self._cache.get(h) for h in hashed]
+
+    def mset(self, key_value_pairs: Sequence[Tuple[str, List[float]]]) -> None:
+        hashed = [(self._key(k), v) for k, v in key_value_pairs]
+        with self._lock:
+            for h, v in hashed:
+                self._cache[h] = v
+
+    def mdelete(self, keys: Sequence[str]) -> None:
+        hashed = [self._key(k) for k in keys]
+        with self._lock:
+            for h in hashed:
+                self._cache.pop(h, None)
+
+    def yield_keys(self, *, prefix: Optional[str] = None) -> Iterator[str]:
+        # Só os hashes ficam guardados: os textos originais não são recuperáveis
+        return iter(())
 
 class VectorDBManager:
     def __init__(self, pinecone_api_key: str, openai_api_key: str):
         self.pinecone_api_key = pinecone_api_key
-        self.pc = Pinecone(api_key=pinecone_api_key)
-        self.embeddings = OpenAIEmbeddings(api_key=openai_api_key)
+        self._openai_api_key = openai_api_key
+        self._pc: Optional[Pinecone] = None
+        self._embeddings: Optional[OpenAIEmbeddings] = None
         self.main_index_name = "hokoainalytics"
+        self._query_embedding_cache: TTLCache = TTLCache(maxsize=EMBEDDING_CACHE_MAXSIZE, ttl=EMBEDDING_CACHE_TTL_SECONDS)
+        self._document_embeddings: Optional[CacheBackedEmbeddings] = None
+        self._embedding_lock = threading.Lock()
+        # Índice verificado uma vez por processo e um vectorstore por namespace (evita list_indexes a cada chamada)
+        self._index_ready = False
+        self._store_cache: Dict[str, PineconeVectorStore] = {}
+        self._store_lock = threading.Lock()
+        # Passes do retrieval multi-pass consultam o Pinecone em paralelo
+        self._search_executor = ThreadPoolExecutor(max_workers=VECTOR_SEARCH_MAX_WORKERS,
+                                                   thread_name_prefix="vector-search")
     
+    @property
+    def pc(self) -> Pinecone:
+        if self._pc is None:
+            with _CLIENTS_LOCK:
+                client = _PINECONE_CLIENTS.get(self.pinecone_api_key)
+                if client is None:
+                    from pinecone import Pinecone
+                    client = _PINECONE_CLIENTS[self.pinecone_api_key] = Pinecone(api_key=self.pinecone_api_key)
+                self._pc = client
+        return self._pc
+
+    @property
+    def embeddings(self) -> OpenAIEmbeddings:
+        if self._embeddings is None:
+            with _CLIENTS_LOCK:
+                client = _EMBEDDING_CLIENTS.get(self._openai_api_key)
+                if client is None:
+                    from langchain_openai import OpenAIEmbeddings
+                    client = _EMBEDDING_CLIENTS[self._openai_api_key] = OpenAIEmbeddings(api_key=self._openai_api_key)
+                self._embeddings = client
+        return self._embeddings
+
+    @property
+    def document_embeddings(self) -> CacheBackedEmbeddings:
+        """Embeddings de documentos com cache por conteúdo (re-uploads do mesmo texto não voltam à OpenAI)."""
+        if self._document_embeddings is None:
+            from langchain.embeddings import CacheBackedEmbeddings
+            model = getattr(self.embeddings, "model", "") or ""
+            store = _EmbeddingStore(model, DOCUMENT_EMBEDDING_CACHE_MAXSIZE, DOCUMENT_EMBEDDING_CACHE_TTL_SECONDS)
+            with self._embedding_lock:
+                if self._document_embeddings is None:
+                    self._document_embeddings = CacheBackedEmbeddings(self.embeddings, store)
+        return self._document_embeddings
+
     def ingest_brand_platform(self, agency_id: str, text: str, tags: Optional[List[str]] = None):
         """
         Ingesta/atualiza o documento de plataforma de marca da agência.
@@ -35,8 +146,36 @@ class VectorDBManager:
         )
 
     def _get_vectorstore(self, namespace: str) -> PineconeVectorStore:
+        with self._store_lock:
+            vs = self._store_cache.get(namespace)
+        if vs is not None:
+            return vs
+        from langchain_pinecone import PineconeVectorStore
         idx = self._create_or_get_main_index()
-        return PineconeVectorStore(index_name=idx, embedding=self.embeddings, namespace=namespace, text_key="text")
+        vs = PineconeVectorStore(index_name=idx, embedding=self.document_embeddings, namespace=namespace, text_key="text")
+        with self._store_lock:
+            return self._store_cache.setdefault(namespace, vs)
+
+    def _embed_query(self, query: str) -> List[float]:
+        """Embedding da consulta com cache (evita um round-trip à OpenAI por repetição)."""
+        key = self._embedding_key(query)
+        with self._embedding_lock:
+            cached = self._query_embedding_cache.get(key)
+        if cached is not None:
+            return cached
+        vector = self.embeddings.embed_query(query)
+        with self._embedding_lock:
+            self._query_embedding_cache[key] = vector
+        return vector
+
+    def _embedding_key(self, text: str) -> str:
+        # Modelo na chave: vetores de modelos diferentes não se misturam se o cliente for trocado
+        model = getattr(self.embeddings, "model", "") or ""
+        return hashlib.blake2b(f"{model}\x00{text}".encode("utf-8"), digest_size=16).hexdigest()
+
+    def _add_texts(self, namespace: str, texts: List[str], metadatas: List[Dict[str, Any]]) -> List[str]:
+        """add_texts no vectorstore em cache do namespace (ids uuid4: cada upload é um registro próprio)."""
+        return self._get_vectorstore(namespace).add_texts(texts, metadatas=metadatas)
 
     def _assemble_context_block(self, docs: List[Document]) -> str:
         """Concatena conteúdos com pequenas fichas de origem úteis à narrativa."""
@@ -61,11 +200,20 @@ class VectorDBManager:
         2) Análises / relatórios recentes
         3) Fallback geral
         Usa MMR para reduzir redundância (fetch_k > k).
+        A consulta é embedada uma única vez e o vetor reaproveitado nos três passes;
+        marca e relatórios rodam em paralelo, o fallback só quando ainda falta contexto.
         """
+        if k_total <= 0:
+            return self._assemble_context_block([])
+
         namespace = self._get_namespace(scope=scope, agency_id=agency_id, client_id=client_id)
         vs = self._get_vectorstore(namespace)
+        query_vector = self._embed_query(query)
 
-        collected: List[Document] = []
+        def mmr(k: int, search_filter: Optional[Dict[str, Any]] = None) -> List[Document]:
+            return vs.max_marginal_relevance_search_by_vector(
+                query_vector, k=k, fetch_k=25, lambda_mult=0.5, filter=search_filter
+            )
 
         # Passo 1 — marca/voz/objetivos (foco em agency)
         brand_filter = {
@@ -74,50 +222,78 @@ class VectorDBManager:
                 {"agency_id": {"$eq": agency_id}}
             ]
         }
-        top_brand = vs.max_marginal_relevance_search(
-            query, k=min(3, k_total), fetch_k=25, lambda_mult=0.5, filter=brand_filter
-        )
-        collected.extend(top_brand)
-
         # Passo 2 — análises/relatórios recentes (quando client)
-        if client_id:
-            report_filter = {
-                "$and": [
-                    {"doc_type": {"$in": ["analise", "relatorio"]}},
-                    {"agency_id": {"$eq": agency_id}},
-                    {"client_id": {"$eq": client_id}}
-                ]
-            }
+        report_filter = {
+            "$and": [
+                {"doc_type": {"$in": ["analise", "relatorio"]}},
+                {"agency_id": {"$eq": agency_id}},
+                {"client_id": {"$eq": client_id}}
+            ]
+        }
+
+        # Marca e relatórios são buscas independentes no Pinecone: disparadas em paralelo, cada uma com o
+        # maior k que pode precisar. O MMR é guloso sobre os mesmos fetch_k candidatos, então os primeiros k
+        # de uma seleção maior são exatamente a seleção com k menor: cortar depois preserva o resultado sequencial.
+        brand_fut = self._search_executor.submit(mmr, min(3, k_total), brand_filter)
+        reports_fut = self._search_executor.submit(mmr, min(3, k_total), report_filter) if client_id else None
+
+        collected: List[Document] = list(brand_fut.result())
+        if reports_fut is not None:
             k_left = max(0, k_total - len(collected))
-            if k_left > 0:
-                top_reports = vs.max_marginal_relevance_search(
-                    query, k=min(3, k_left), fetch_k=25, lambda_mult=0.5, filter=report_filter
-                )
-                collected.extend(top_reports)
+            collected.extend(reports_fut.result()[:min(3, k_left)])
 
-        # Passo 3 — fallback geral (sem filtro) se ainda faltar contexto
+        # Passo 3 — fallback geral (sem filtro): só consulta se ainda faltar contexto
         k_left = max(0, k_total - len(collected))
         if k_left > 0:
-            fallback = vs.max_marginal_relevance_search(query, k=k_left, fetch_k=25, lambda_mult=0.5)
-            collected.extend(fallback)
+            collected.extend(mmr(k_left))
 
         return self._assemble_context_block(collected)
 
     def _create_or_get_main_index(self) -> str:
         """Cria ou obtém o índice principal do Pinecone"""
-        if self.main_index_name not in [index.name for index in self.pc.list_indexes()]:
+        if self._index_ready:
+            return self.main_index_name
+        # Marca em disco: outros workers/boots da mesma máquina já confirmaram o índice
+        flag = self._index_flag_path()
+        if flag.exists():
+            self._index_ready = True
+            return self.main_index_name
+        from pinecone import ServerlessSpec
+        if not self.pc.has_index(self.main_index_name):
             self.pc.create_index(
                 name=self.main_index_name,
                 dimension=1536,  # Dimension for OpenAI embeddings
                 metric="cosine",
                 spec=ServerlessSpec(cloud="aws", region="us-east-1")
             )
+        self._index_ready = True
+        try:
+            flag.touch()
+        except OSError:
+            pass  # sem escrita no tmp: só o cache em memória vale
         return self.main_index_name
+
+    def invalidate(self) -> None:
+        """Esquece o índice verificado e os vectorstores por namespace (ex.: índice recriado)."""
+        with self._store_lock:
+            self._store_cache.clear()
+        self._index_ready = False
+        try:
+            self._index_flag_path().unlink()
+        except OSError:
+            pass
+
+    def _index_flag_path(self) -> Path:
+        # Por índice e por projeto (hash da chave): chaves diferentes na mesma máquina não se confundem
+        key_hash = hashlib.blake2b(self.pinecone_api_key.encode("utf-8"), digest_size=6).hexdigest()
+        return Path(tempfile.gettempdir()) / f"pc_idx_{self.main_index_name}_{key_hash}.ok"
     
-    def _get_namespace(self, scope: Literal["global", "agency", "client"], 
+    @staticmethod
+    @lru_cache(maxsize=4096)
+    def _get_namespace(scope: Literal["global", "agency", "client"], 
                       agency_id: Optional[str] = None, 
                       client_id: Optional[str] = None) -> str:
-        """Gera o namespace baseado no escopo e IDs"""
+        """Gera o namespace baseado no escopo e IDs (memoizado: depende só dos argumentos)"""
         if scope == "global":
             return "global"
         elif scope == "agency":
@@ -157,12 +333,10 @@ class VectorDBManager:
         if force_reload:
             index = self.pc.Index(index_name)
             index.delete(delete_all=True, namespace=namespace)
+            with self._store_lock:
+                self._store_cache.pop(namespace, None)
         
-        return PineconeVectorStore(
-            index_name=index_name,
-            embedding=self.embeddings,
-            namespace=namespace
-        )
+        return self._get_vectorstore(namespace)
     
     def store_document(
         self, 
@@ -182,7 +356,6 @@ class VectorDBManager:
         """Armazena documento no banco vetorial com metadata estruturada e consistente"""
 
         namespace = self._get_namespace(scope=scope, agency_id=agency_id, client_id=client_id)
-        idx = self._create_or_get_main_index()
 
         # -- METADATA padronizada para habilitar filtros:
         metadata = {
@@ -196,7 +369,7 @@ class VectorDBManager:
             "confidentiality": confidentiality,  # baixa | media | alta
             "main_category": main_category,      # ex: "brand", "performance", "planejamento"
             "subcategory": subcategory,          # ex: "voice", "guidelines", "kpis"
-            "created_at": datetime.utcnow().isoformat() + "Z",
+            "created_at": _utc_now_iso(),
         }
 
         if context and "customer_name" in context:
@@ -204,17 +377,31 @@ class VectorDBManager:
 
 
         # **Importante**: Pinecone aceita filtros por metadados; manter chaves simples/flat ajuda.
-        # Upsert via LangChain:
-        vectorstore = PineconeVectorStore(
-            index_name=idx, 
-            embedding=self.embeddings, 
-            namespace=namespace, 
-            text_key="text"
+        # Embedding por conteúdo em cache: re-upload do mesmo texto não chama a OpenAI
+        self._add_texts(namespace, [content], [metadata])
+
+    def store_documents_bulk(
+        self,
+        docs: List[Document],
+        scope: Literal["global", "agency", "client"],
+        agency_id: Optional[str] = None,
+        client_id: Optional[str] = None
+    ) -> List[str]:
+        """Armazena vários documentos de uma vez: um único request de embeddings e um upsert."""
+        if not docs:
+            return []
+        namespace = self._get_namespace(scope=scope, agency_id=agency_id, client_id=client_id)
+        # Um único instante de ingestão para o lote (created_at como em store_document, sem sobrescrever)
+        created_at = _utc_now_iso()
+        return self._add_texts(
+            namespace,
+            [d.page_content for d in docs],
+            [{"created_at": created_at, **(d.metadata or {})} for d in docs],
         )
-        vectorstore.add_texts(texts=[content], metadatas=[metadata])
 
     def generate_data_summary(self, df: pd.DataFrame, client_id: str, platform: str) -> List[Document]:
         """Gera sumário de dados - atualizado para nova estrutura"""
+        from langchain.schema import Document
         # Extrai agency_id do client_id
         if "_" in client_id:
             parts = client_id.split("_", 1)
@@ -231,23 +418,24 @@ class VectorDBManager:
         info_str += f"Colunas: {', '.join(df.columns)}\n"
         
         # Tipos de dados
-        dtypes_str = "Tipos de dados das colunas:\n"
-        for col, dtype in df.dtypes.items():
-            dtypes_str += f"- {col}: {dtype}\n"
+        dtypes_str = "Tipos de dados das colunas:\n" + "".join(
+            f"- {col}: {dtype}\n" for col, dtype in df.dtypes.items()
+        )
         
         # Estatísticas básicas para colunas numéricas
         stats_str = "Estatísticas básicas para colunas numéricas:\n"
-        numeric_cols = df.select_dtypes(include=['number']).columns
-        if not numeric_cols.empty:
-            stats = df[numeric_cols].describe().to_string()
+        numeric_df = df.select_dtypes(include=['number'])
+        if numeric_df.shape[1] > 0:
+            stats = numeric_df.describe().to_string()
             stats_str += stats + "\n"
         
         # Valores ausentes
-        missing_str = "Valores ausentes:\n"
-        for col in df.columns:
-            missing_count = df[col].isna().sum()
-            if missing_count > 0:
-                missing_str += f"- {col}: {missing_count} valores ausentes ({missing_count/len(df)*100:.2f}%)\n"
+        # Contagem de ausentes de todas as colunas numa única passada
+        missing = df.isna().sum()
+        missing_str = "Valores ausentes:\n" + "".join(
+            f"- {col}: {missing_count} valores ausentes ({missing_count/len(df)*100:.2f}%)\n"
+            for col, missing_count in missing[missing > 0].items()
+        )
         
         # Informações de datas
         date_str = "Period: "
@@ -255,9 +443,10 @@ class VectorDBManager:
         for col in date_cols:
             if col in df.columns:
                 try:
-                    df[col] = pd.to_datetime(df[col])
-                    min_date = df[col].min()
-                    max_date = df[col].max()
+                    # Sem reescrever a coluna do DF do chamador; já datetime64 não é reparseado
+                    s = df[col] if is_datetime64_any_dtype(df[col]) else pd.to_datetime(df[col], cache=True)
+                    min_date = s.min()
+                    max_date = s.max()
                     date_str += f"{min_date} até {max_date}\n"
                 except:
                     date_str += f"não foi possível converter para datetime\n"
@@ -0,0 +1,10 @@
+# ===== Arquivo: utils/deps.py =====
+from functools import lru_cache
+
+from utils.advanced_data_analyst import AdvancedDataAnalyst
+
+
+@lru_cache(maxsize=1)
+def get_analyst() -> AdvancedDataAnalyst:
+    """Instância única do analista (pool do RDS, Pinecone e embeddings) compartilhada pelos serviços."""
+    return AdvancedDataAnalyst()
@@ -1,6 +1,7 @@
 # ===== utils/prompts/system_prompts.py  —  SSOT de prompts ho.ko =====
 from __future__ import annotations
-from typing import List, Dict, Any, Tuple
+from functools import lru_cache
+from typing import List, Dict, Any, Optional, Tuple
 
 # =========================
 # 0) Identidade da Marca
@@ -51,18 +52,38 @@ def _split_platform_and_base(col: str) -> Tuple[str, str]:
     p, b = col.split("_", 1)
     return p, b
 
-def _friendly_label(col: str) -> str:
+def _derive_label(col: str) -> str:
     p, b = _split_platform_and_base(col)
     plat = PLATFORM_DISPLAY.get(p, p.title() if p else "")
     base = BASE_LABELS.get(b, b.replace("_", " ").title())
     return f"{base} ({plat})" if plat else base
 
+# Rótulos das métricas conhecidas (plataforma x base) resolvidos uma vez na importação,
+# com a mesma regra de _derive_label (o split no primeiro "_" vale também para google_analytics)
+PRECOMPUTED_LABELS = {
+    col: _derive_label(col)
+    for col in (f"{p}_{b}" for p in PLATFORM_DISPLAY for b in BASE_LABELS)
+}
+
+_EMPTY_VOCABULARY_BLOCK = "[VOCABULÁRIO]\n(Não há métricas selecionadas; use rótulos amigáveis.)"
+
+def _friendly_label(col: str) -> str:
+    label = PRECOMPUTED_LABELS.get(col)
+    return label if label is not None else _derive_label(col)
+
 def build_vocabulary_block(summary_json: Dict[str, Any]) -> str:
-    selected = list(summary_json.get("meta", {}).get("selected_metrics", [])) or []
+    selected = summary_json.get("meta", {}).get("selected_metrics", []) or []
     if not selected:
-        return "[VOCABULÁRIO]\n(Não há métricas selecionadas; use rótulos amigáveis.)"
-    lines = [f"- {col} -> {_friendly_label(col)}" for col in selected]
-    return "[VOCABULÁRIO]\nNUNCA exiba nomes internos; traduza como segue:\n" + "\n".join(lines)
+        return _EMPTY_VOCABULARY_BLOCK
+    return _vocabulary_block(tuple(selected))
+
+@lru_cache(maxsize=128)
+def _vocabulary_block(selected: Tuple[str, ...]) -> str:
+    if not selected:
+        return _EMPTY_VOCABULARY_BLOCK
+    return "[VOCABULÁRIO]\nNUNCA exiba nomes internos; traduza como segue:\n" + "\n".join(
+        f"- {col} -> {_friendly_label(col)}" for col in selected
+    )
 
 # =======================================
 # 2) Perfis de audiência (persona alvo)
@@ -73,6 +94,7 @@ VOICE_PROFILES = {
     "PERFORMANCE_MIDIA": "Foque em mix, criativo, frequência e orçamento. Próximos testes da sprint."
 }
 
+@lru_cache(maxsize=256)
 def build_chat_system_prompt(client_name: str, voice_profile: str = "CMO", analysis_focus: str = "panorama") -> str:
     return f"""
         {BASE_ANALYST_PROMPT}
@@ -236,6 +258,7 @@ def apply_format_instructions(base_prompt: str, fmt: str) -> str:
         )
 
 
+@lru_cache(maxsize=64)
 def get_system_prompt(analysis_type: str, fmt: str) -> str:
     atype = (analysis_type or "descriptive").lower()
     if atype in ("descriptive", "descritiva", "descricao"):
@@ -264,6 +287,10 @@ def _fmt_platforms(platforms: List[str]) -> str:
     return ", ".join(label[:-1]) + (" e " + label[-1] if len(label)>1 else "")
 
 def get_platform_prompt(platforms: List[str]) -> str:
+    return _platform_prompt(tuple(platforms))
+
+@lru_cache(maxsize=64)
+def _platform_prompt(platforms: Tuple[str, ...]) -> str:
     secs = []
     for p in platforms:
         if p in PLATFORM_PROMPTS:
@@ -271,25 +298,28 @@ def get_platform_prompt(platforms: List[str]) -> str:
     return "[PLATAFORMAS]\n" + _fmt_platforms(platforms) + ("\n" + "\n".join(secs) if secs else "")
 
 # === Default user-facing request when none is provided ===
+ANALYSIS_REQUEST_TEMPLATES = {
+    "descriptive": "Quero uma análise descritiva de {plats}{df}, descrevendo o que aconteceu e por que isso importa (sem recomendações).".format,
+    "predictive": "Quero uma análise preditiva de {plats}{df}: traga 3 cenários com probabilidades, gatilhos e sinais antecedentes.".format,
+    "prescriptive": "Quero uma análise prescritiva de {plats}{df}: um plano de ação priorizado com responsável, prazo e como medir.".format,
+    "general": "Quero uma visão integrada de {plats}{df}: descritiva, preditiva e prescritiva em alto nível.".format,
+}
+
+ANALYSIS_TYPE_ALIAS = {
+    "descritiva": "descriptive", "descricao": "descriptive",
+    "preditiva": "predictive", "prescritiva": "prescriptive",
+    "geral": "general", "overall": "general", "all": "general"
+}
+
 def get_analysis_prompt(analysis_type: str, platforms: list[str], date_filter: str = "") -> str:
-    # Normaliza tipo
-    alias = {
-        "descritiva": "descriptive", "descricao": "descriptive",
-        "preditiva": "predictive", "prescritiva": "prescriptive",
-        "geral": "general", "overall": "general", "all": "general"
-    }
-    atype = alias.get((analysis_type or "descriptive").lower(), analysis_type)
-    plats = _fmt_platforms(platforms)
-    df = (date_filter or "").strip()
+    return _analysis_prompt(analysis_type, tuple(platforms), date_filter)
 
-    if atype == "descriptive":
-        return f"Quero uma análise descritiva de {plats}{df}, descrevendo o que aconteceu e por que isso importa (sem recomendações)."
-    if atype == "predictive":
-        return f"Quero uma análise preditiva de {plats}{df}: traga 3 cenários com probabilidades, gatilhos e sinais antecedentes."
-    if atype == "prescriptive":
-        return f"Quero uma análise prescritiva de {plats}{df}: um plano de ação priorizado com responsável, prazo e como medir."
-    # general
-    return f"Quero uma visão integrada de {plats}{df}: descritiva, preditiva e prescritiva em alto nível."
+@lru_cache(maxsize=256)
+def _analysis_prompt(analysis_type: str, platforms: Tuple[str, ...], date_filter: str) -> str:
+    # Normaliza tipo
+    atype = ANALYSIS_TYPE_ALIAS.get((analysis_type or "descriptive").lower(), analysis_type)
+    template = ANALYSIS_REQUEST_TEMPLATES.get(atype, ANALYSIS_REQUEST_TEMPLATES["general"])
+    return template(plats=_fmt_platforms(platforms), df=(date_filter or "").strip())
 
 
 # ==========================================
@@ -438,54 +468,36 @@ def _fewshots_for(atype: str, focus: str, summary_json: Dict[str, Any]) -> str:
 # =======================================================
 # 7) Construtor Único do Prompt de Narrativa (LLM)
 # =======================================================
-def build_narrative_prompt(
-    platforms: List[str],
-    analysis_type: str,
-    analysis_focus: str,
-    analysis_query: str,
-    context_text: str,
-    summary_json: Dict[str, Any],
-    output_format: str = "detalhada",
-    granularity: str = "detalhada",
-    bilingual: bool = True,
-    voice_profile: str = "CMO",
-    decision_mode: str = "decision_brief",
-    narrative_style: str = "SCQA"
-) -> str:
-    # Mapas
-    alias_type = {
-        "descritiva": "descriptive",
-        "descricao": "descriptive",
-        "preditiva": "predictive",
-        "prescritiva": "prescriptive",
-        "geral": "general",
-        "overall": "general",
-        "all": "general",
-    }
-    atype = alias_type.get((analysis_type or "descriptive").lower(), analysis_type)
-    focus = FOCUS_ALIAS.get((analysis_focus or "panorama").lower(), "panorama")
+# Cabeçalho fixo do prompt (identidade + guia de estilo), montado uma única vez
+_NARRATIVE_HEAD = f"""
+        {BASE_ANALYST_PROMPT}
+        {STYLE_GUIDE}
 
-    # Formato de saída
-    fmt = (output_format or "detalhado").lower()
+        """.lstrip()
+
+# Aliases de tipo e limites de palavras do prompt de narrativa
+_NARRATIVE_TYPE_ALIAS = {
+    "descritiva": "descriptive",
+    "descricao": "descriptive",
+    "preditiva": "predictive",
+    "prescritiva": "prescriptive",
+    "geral": "general",
+    "overall": "general",
+    "all": "general",
+}
 
-    # Blocos-base
-    platform_hint = get_platform_prompt(platforms)
-    vocabulary_block = build_vocabulary_block(summary_json)
-    focus_block = FOCUS_OVERLAYS[focus]
-    system_prompt_block = get_system_prompt(atype, fmt)
-    persona_block = f"[PERFIL] {voice_profile}: {VOICE_PROFILES.get(voice_profile, '')}"
-    narr_block = f"[ESTILO NARRATIVO] Use {narrative_style} (SCQA/Minto) para organizar a história."
+_NARRATIVE_BASE_CAPS = {
+    "descriptive": 900,
+    "predictive": 900,
+    "prescriptive": 1000,
+    "general": 1100,
+}
 
+@lru_cache(maxsize=64)
+def _narrative_rule_blocks(atype: str, fmt: str, decision_mode: Optional[str]) -> Tuple[str, str, str]:
+    """(regras complementares, decision brief, saída) para um tipo/formato/modo de decisão."""
     # Limite de palavras de acordo com tipo + formato
-    base_caps = {
-        "descriptive": 900,
-        "predictive": 900,
-        "prescriptive": 1000,
-        "general": 1100,
-    }
-
-    base_cap = base_caps.get(atype, 500)
-    fmt = (output_format or "detalhado").lower()
+    base_cap = _NARRATIVE_BASE_CAPS.get(atype, 500)
 
     if fmt == "resumido":
         word_cap = int(base_cap * 0.45)
@@ -517,17 +529,6 @@ def build_narrative_prompt(
             - O que fazer agora (3–5 ações priorizadas; dono e prazo).
             """
 
-    # Few-shots específicos (com gating simples pelos dados)
-    examples_block = ""
-    if fmt in ("resumido", "topicos"):
-        examples_block = _fewshots_for(atype, focus, summary_json)
-
-
-    bilingual_block = (
-        "Rascunhe mentalmente em inglês se quiser, mas **entregue apenas em PT-BR**; "
-        "não exponha raciocínio."
-    ) if bilingual else "Responda diretamente em PT-BR."
-
     # Regras complementares, mais data-driven e específicas por tipo
     regras = [
         "- Conecte achados a impacto (receita, crescimento, eficiência).",
@@ -583,38 +584,75 @@ def build_narrative_prompt(
             - Sempre que possível, cite valores e datas do [DADOS] ao comentar um movimento relevante.
         """
 
-    # Prompt final
-    return f"""
-        {BASE_ANALYST_PROMPT}
-        {STYLE_GUIDE}
-
-        {persona_block}
-        {focus_block}
-        {platform_hint}
-        {vocabulary_block}
-        {narr_block}
-
-        [TAREFA]
-        {system_prompt_block}
+    return regras_block, decision_brief, saida_block
 
-        [REGRAS COMPLEMENTARES]
-        {regras_block}
+def build_narrative_prompt(
+    platforms: List[str],
+    analysis_type: str,
+    analysis_focus: str,
+    analysis_query: str,
+    context_text: str,
+    summary_json: Dict[str, Any],
+    output_format: str = "detalhada",
+    granularity: str = "detalhada",
+    bilingual: bool = True,
+    voice_profile: str = "CMO",
+    decision_mode: str = "decision_brief",
+    narrative_style: str = "SCQA",
+    summary_text: Optional[str] = None
+) -> str:
+    # summary_text: summary_json já serializado (reaproveitado entre chamadas com o mesmo resumo)
+    if summary_text is None:
+        summary_text = str(summary_json)
 
-        [CONTEXTO (RAG)]
-        {context_text if context_text else "(sem contexto recuperado)"}
+    atype = _NARRATIVE_TYPE_ALIAS.get((analysis_type or "descriptive").lower(), analysis_type)
+    focus = FOCUS_ALIAS.get((analysis_focus or "panorama").lower(), "panorama")
 
-        [DADOS (JSON CONFIÁVEL)]
-        {summary_json}
+    # Formato de saída
+    fmt = (output_format or "detalhado").lower()
 
-        {decision_brief}
+    # Blocos-base
+    platform_hint = get_platform_prompt(platforms)
+    vocabulary_block = build_vocabulary_block(summary_json)
+    focus_block = FOCUS_OVERLAYS[focus]
+    system_prompt_block = get_system_prompt(atype, fmt)
+    persona_block = f"[PERFIL] {voice_profile}: {VOICE_PROFILES.get(voice_profile, '')}"
+    narr_block = f"[ESTILO NARRATIVO] Use {narrative_style} (SCQA/Minto) para organizar a história."
 
-        {saida_block}
+    # Regras, decision brief e saída dependem só de tipo/formato/modo: montados uma vez por combinação
+    regras_block, decision_brief, saida_block = _narrative_rule_blocks(atype, fmt, decision_mode)
 
-        [PEDIDO DO USUÁRIO]
-        {analysis_query}
+    # Few-shots específicos (com gating simples pelos dados)
+    examples_block = ""
+    if fmt in ("resumido", "topicos"):
+        examples_block = _fewshots_for(atype, focus, summary_json)
 
-        {bilingual_block}
 
-        {examples_block}
-    """.strip()
+    bilingual_block = (
+        "Rascunhe mentalmente em inglês se quiser, mas **entregue apenas em PT-BR**; "
+        "não exponha raciocínio."
+    ) if bilingual else "Responda diretamente em PT-BR."
 
+    # Prompt final: um único join com as partes fixas pré-montadas; as bordas são aparadas
+    # nas próprias partes (mesmo resultado do antigo .strip(), sem recopiar o prompt inteiro)
+    if examples_block.strip():
+        tail = [bilingual_block, "\n\n        ", examples_block.rstrip()]
+    else:
+        tail = [bilingual_block.rstrip()]
+    return "".join([
+        _NARRATIVE_HEAD,
+        persona_block, "\n        ",
+        focus_block, "\n        ",
+        platform_hint, "\n        ",
+        vocabulary_block, "\n        ",
+        narr_block,
+        "\n\n        [TAREFA]\n        ", system_prompt_block,
+        "\n\n        [REGRAS COMPLEMENTARES]\n        ", regras_block,
+        "\n\n        [CONTEXTO (RAG)]\n        ", context_text if context_text else "(sem contexto recuperado)",
+        "\n\n        [DADOS (JSON CONFIÁVEL)]\n        ", summary_text,
+        "\n\n        ", decision_brief,
+        "\n\n        ", saida_block,
+        "\n\n        [PEDIDO DO USUÁRIO]\n        ", str(analysis_query),
+        "\n\n        ",
+        *tail,
+    ])